@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -16,6 +17,9 @@ class Settings:
     MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
     DATABASE_NAME: str = os.getenv("DATABASE_NAME", "nexuschat")
     
+    # Users allowed to read /api/metrics (comma-separated ids)
+    METRICS_USER_IDS: set = set(filter(None, os.getenv("METRICS_USER_IDS", "").split(",")))
+    
     # JWT Settings
     JWT_SECRET: str = os.getenv("JWT_SECRET", "nexuschat-super-secret-key-change-in-production")
     JWT_ALGORITHM: str = "HS256"
@@ -27,6 +31,79 @@ class Settings:
     # File Upload
     MAX_FILE_SIZE: int = 50 * 1024 * 1024  # 50MB
     ALLOWED_EXTENSIONS: set = {"*"}  # All file types allowed
+    UPLOAD_CHUNK_SIZE: int = 255 * 1024  # Matches the default GridFS chunk size
+    
+    UPLOAD_SESSION_TTL_HOURS: int = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))  # Resumable uploads idle timeout
+    UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS", "900"))
+    THUMBNAIL_WORKERS: int = int(os.getenv("THUMBNAIL_WORKERS", "2"))  # Image thumbnail worker processes
+    THUMBNAIL_MAX_SOURCE_BYTES: int = int(os.getenv("THUMBNAIL_MAX_SOURCE_BYTES", str(20 * 1024 * 1024)))  # Larger images get no thumbnails
+    
+    # Auto-save export of received files to local disk
+    AUTO_SAVE_DIR: str = os.getenv("AUTO_SAVE_DIR", os.path.join(os.path.expanduser("~"), "NexusChat"))
+    AUTO_SAVE_CONCURRENCY: int = int(os.getenv("AUTO_SAVE_CONCURRENCY", "4"))
+    
+    # Status feeds
+    STATUS_FEED_CACHE_SIZE: int = int(os.getenv("STATUS_FEED_CACHE_SIZE", "10000"))
+    STATUS_FEED_CACHE_TTL_SECONDS: int = int(os.getenv("STATUS_FEED_CACHE_TTL_SECONDS", "300"))
+    
+    # Status expiry: the sweeper releases media and notifies contacts; the TTL
+    # index removes anything it missed once the grace period has also passed
+    STATUS_EXPIRY_HOURS: int = 24
+    STATUS_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("STATUS_SWEEP_INTERVAL_SECONDS", "60"))
+    STATUS_TTL_GRACE_SECONDS: int = int(os.getenv("STATUS_TTL_GRACE_SECONDS", "21600"))
+    
+    # Calls
+    CALL_RING_TIMEOUT_SECONDS: int = int(os.getenv("CALL_RING_TIMEOUT_SECONDS", "45"))
+    CALL_REAPER_INTERVAL_SECONDS: int = int(os.getenv("CALL_REAPER_INTERVAL_SECONDS", "5"))
+    ICE_BATCH_WINDOW_MS: int = int(os.getenv("ICE_BATCH_WINDOW_MS", "20"))
+    GROUP_CALL_MAX_PARTICIPANTS: int = int(os.getenv("GROUP_CALL_MAX_PARTICIPANTS", "8"))
+    GROUP_CALL_RING_BATCH_SIZE: int = int(os.getenv("GROUP_CALL_RING_BATCH_SIZE", "50"))
+    CALL_STATS_MAX_SAMPLES: int = int(os.getenv("CALL_STATS_MAX_SAMPLES", "720"))
+    CALL_STATS_RETENTION_DAYS: int = int(os.getenv("CALL_STATS_RETENTION_DAYS", "30"))
+    
+    # Arise AI calls
+    AI_WORKERS: int = int(os.getenv("AI_WORKERS", "8"))
+    AI_MAX_CONCURRENT_PER_USER: int = int(os.getenv("AI_MAX_CONCURRENT_PER_USER", "2"))
+    AI_MAX_QUEUE: int = int(os.getenv("AI_MAX_QUEUE", "64"))
+    AI_TIMEOUT_SECONDS: int = int(os.getenv("AI_TIMEOUT_SECONDS", "60"))
+    
+    # Arise model backend: "gemini", or "local" for an offline deterministic
+    # stand-in with simulated latency (load tests and benchmarks)
+    LLM_PROVIDER: str = os.getenv("LLM_PROVIDER", "gemini")
+    LOCAL_LLM_FIRST_TOKEN_MS: int = int(os.getenv("LOCAL_LLM_FIRST_TOKEN_MS", "300"))
+    LOCAL_LLM_TOKEN_MS: int = int(os.getenv("LOCAL_LLM_TOKEN_MS", "25"))
+    LOCAL_LLM_RESPONSE_TOKENS: int = int(os.getenv("LOCAL_LLM_RESPONSE_TOKENS", "80"))
+    
+    # Arise response cache for repeated prompts (0 disables)
+    AI_CACHE_SIZE: int = int(os.getenv("AI_CACHE_SIZE", "2000"))
+    AI_CACHE_TTL_SECONDS: int = int(os.getenv("AI_CACHE_TTL_SECONDS", "3600"))
+    
+    # File info lookups
+    FILE_INFO_CACHE_SIZE: int = int(os.getenv("FILE_INFO_CACHE_SIZE", "10000"))
+    FILE_INFO_CACHE_TTL_SECONDS: int = int(os.getenv("FILE_INFO_CACHE_TTL_SECONDS", "600"))
+    MAX_FILE_INFO_BATCH: int = 200
+    
+    # Local disk cache for hot GridFS files (0 disables)
+    BLOB_CACHE_DIR: str = os.getenv("BLOB_CACHE_DIR", os.path.join(tempfile.gettempdir(), "nexuschat-blob-cache"))
+    BLOB_CACHE_MAX_BYTES: int = int(os.getenv("BLOB_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))  # 1GB
+    BLOB_CACHE_MAX_FILE_BYTES: int = int(os.getenv("BLOB_CACHE_MAX_FILE_BYTES", str(50 * 1024 * 1024)))
+    
+    # Message Deduplication (client-generated ids)
+    MESSAGE_DEDUP_TTL_SECONDS: int = int(os.getenv("MESSAGE_DEDUP_TTL_SECONDS", "600"))
+    MESSAGE_DEDUP_CACHE_SIZE: int = int(os.getenv("MESSAGE_DEDUP_CACHE_SIZE", "10000"))
+    
+    # Reply Previews
+    REPLY_PREVIEW_CACHE_SIZE: int = int(os.getenv("REPLY_PREVIEW_CACHE_SIZE", "5000"))
+    REPLY_PREVIEW_CACHE_TTL_SECONDS: int = int(os.getenv("REPLY_PREVIEW_CACHE_TTL_SECONDS", "300"))
+    
+    # Background Jobs
+    JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+    JOB_BATCH_SIZE: int = int(os.getenv("JOB_BATCH_SIZE", "500"))
+    JOB_BATCH_DELAY_SECONDS: float = float(os.getenv("JOB_BATCH_DELAY_SECONDS", "0.05"))
+    JOB_RETENTION_DAYS: int = int(os.getenv("JOB_RETENTION_DAYS", "7"))  # Finished jobs are pruned after this
+    
+    # Maintenance
+    TRASH_SWEEP_INTERVAL_SECONDS: int = int(os.getenv("TRASH_SWEEP_INTERVAL_SECONDS", "3600"))
     
     # WebRTC STUN/TURN Servers
     ICE_SERVERS: list = [
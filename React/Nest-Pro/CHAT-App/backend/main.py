@@ -1,8 +1,11 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse, HTMLResponse
 from contextlib import asynccontextmanager
+from pydantic import BaseModel, Field
+from typing import List
+import asyncio
 import json
 import uuid
 import os
@@ -11,35 +14,70 @@ from bson import ObjectId
 
 from config import settings
 from utils.db import connect_db, disconnect_db, get_db
-from utils.auth import decode_token
+from utils.auth import decode_token, get_current_user
 from services.websocket import manager
-from services.webrtc import call_manager, create_offer_message, create_answer_message, create_ice_candidate_message, create_call_ended_message
+from services.jobs import job_queue
+from services.scheduler import scheduler
+from services.upload_sessions import expire_abandoned_sessions, reset_interrupted_writes
+from services.blob_cache import blob_cache
+from services.metrics import metrics
+from services.message_dedup import insert_message, normalize_client_id
+from services.reply_previews import get_reply_preview
+from services.media_index import index_message
+from services.ai_executor import ai_executor, AIBusy
+from services.auto_save import queue_export, queue_batch_export, init_folders, auto_save_base
+from services.thumbnails import resolve_file_previews, shutdown_pool as shutdown_thumbnail_pool
+from services.group_signaling import GroupSignalingError, RELAYED_TYPES, start_group_call, join_group_call, relay_group_signal
+from services.llm import llm
+from services.webrtc import call_manager, create_offer_message, create_answer_message, create_ice_candidates_message, finish_call, ice_batcher, relay, observe_setup, reap_stale_calls
 
 # Import routes
 from routes.auth import router as auth_router
 from routes.users import router as users_router
 from routes.messages import router as messages_router
 from routes.files import router as files_router
-from routes.ai import router as ai_router
+from routes.ai import (
+    router as ai_router, AriseMessage, arise_prompt,
+    stream_chat_reply, stream_conversation_reply, get_user_conversation
+)
 from routes.rooms import router as rooms_router
 from routes.settings import router as settings_router, block_router
-from routes.archive import router as archive_router
+from routes.archive import router as archive_router, sweep_expired_otps, OTP_SWEEP_INTERVAL_SECONDS
 from routes.calls import router as calls_router
-from routes.status import router as status_router
-from routes.chat_actions import router as chat_actions_router
+from routes.status import router as status_router, purge_expired_statuses
+from routes.chat_actions import router as chat_actions_router, purge_expired_trash
+from routes.jobs import router as jobs_router
+from routes.uploads import router as uploads_router
 
 # Get absolute path to frontend directory
 FRONTEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend"))
 
+def register_maintenance_jobs():
+    """Periodic cleanup, run by the scheduler while the app is up"""
+    scheduler.add("expired_otps", OTP_SWEEP_INTERVAL_SECONDS, sweep_expired_otps)
+    scheduler.add("expired_trash", settings.TRASH_SWEEP_INTERVAL_SECONDS, purge_expired_trash)
+    scheduler.add("abandoned_uploads", settings.UPLOAD_SESSION_SWEEP_INTERVAL_SECONDS, expire_abandoned_sessions)
+    scheduler.add("expired_statuses", settings.STATUS_SWEEP_INTERVAL_SECONDS, purge_expired_statuses)
+    scheduler.add("stale_calls", settings.CALL_REAPER_INTERVAL_SECONDS, reap_stale_calls)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Startup and shutdown events"""
+    blob_cache.load()
+    register_maintenance_jobs()
     try:
         await connect_db()
+        await reset_interrupted_writes()
+        await job_queue.start()
+        await scheduler.start()
     except Exception as e:
         print(f"⚠️ Warning: Could not connect to MongoDB: {e}")
         print("⚠️ Some features requiring database may not work")
     yield
+    await scheduler.stop()
+    await job_queue.stop()
+    shutdown_thumbnail_pool()
+    ai_executor.shutdown()
     await disconnect_db()
 
 app = FastAPI(
@@ -76,6 +114,8 @@ app.include_router(archive_router)
 app.include_router(calls_router)
 app.include_router(status_router)
 app.include_router(chat_actions_router)
+app.include_router(jobs_router)
+app.include_router(uploads_router)
 
 # Get absolute path to frontend directory - more robust
 import pathlib
@@ -134,6 +174,9 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, token: str = No
         "users": online_users
     })
     
+    # Arise replies streaming to this connection: request_id -> task
+    arise_streams = {}
+    
     try:
         while True:
             # Receive message
@@ -181,66 +224,41 @@ async def websocket_endpoint(websocket: WebSocket, user_id: str, token: str = No
                 manager.leave_room(room_id, user_id)
             
             # Group Call Handlers
-            elif msg_type == "group_call_start":
-                room_id = message_data.get("room_id")
-                call_type = message_data.get("call_type", "video")
-                call_id = message_data.get("call_id")
-                await manager.start_group_call(room_id, user_id, username, call_type, call_id)
-                # Send confirmation to initiator
-                await websocket.send_json({
-                    "type": "group_call_started",
-                    "room_id": room_id,
-                    "call_id": call_id
-                })
-            
-            elif msg_type == "group_call_join":
-                room_id = message_data.get("room_id")
-                call = await manager.join_group_call(room_id, user_id, username)
-                if call:
-                    # Send call info to joiner
+            elif msg_type in ("group_call_start", "group_call_join") or msg_type in RELAYED_TYPES:
+                try:
+                    await handle_group_call_message(websocket, user_id, username, message_data)
+                except GroupSignalingError as e:
                     await websocket.send_json({
-                        "type": "group_call_joined",
-                        "room_id": room_id,
-                        "call_id": call["call_id"],
-                        "participants": list(call["participants"])
+                        "type": "group_call_error",
+                        "room_id": message_data.get("room_id"),
+                        "request": msg_type,
+                        "error": str(e)
                     })
             
             elif msg_type == "group_call_leave":
                 room_id = message_data.get("room_id")
                 await manager.leave_group_call(room_id, user_id)
             
-            elif msg_type == "group_call_offer":
-                # Relay offer to specific participant
-                to_user = message_data.get("to")
-                await manager.send_personal(to_user, {
-                    "type": "group_call_offer",
-                    "from": user_id,
-                    "from_name": username,
-                    "room_id": message_data.get("room_id"),
-                    "sdp": message_data.get("sdp")
-                })
+            # Arise streaming
+            elif msg_type == "arise_chat":
+                request_id = message_data.get("request_id") or str(uuid.uuid4())
+                task = asyncio.create_task(stream_arise_reply(websocket, user_id, request_id, message_data))
+                arise_streams[request_id] = task
+                task.add_done_callback(lambda _, rid=request_id: arise_streams.pop(rid, None))
             
-            elif msg_type == "group_call_answer":
-                # Relay answer to specific participant
-                to_user = message_data.get("to")
-                await manager.send_personal(to_user, {
-                    "type": "group_call_answer",
-                    "from": user_id,
-                    "room_id": message_data.get("room_id"),
-                    "sdp": message_data.get("sdp")
-                })
-            
-            elif msg_type == "group_call_ice":
-                # Relay ICE candidate to specific participant
-                to_user = message_data.get("to")
-                await manager.send_personal(to_user, {
-                    "type": "group_call_ice",
-                    "from": user_id,
-                    "room_id": message_data.get("room_id"),
-                    "candidate": message_data.get("candidate")
-                })
+            elif msg_type == "arise_cancel":
+                task = arise_streams.get(message_data.get("request_id"))
+                if task:
+                    task.cancel()
     
     except WebSocketDisconnect:
+        pass
+    finally:
+        # Closing the socket aborts any Arise generation still streaming to it
+        for task in list(arise_streams.values()):
+            task.cancel()
+
+        # Also runs if the handler fails, so calls and group calls never outlive the connection
         await manager.disconnect(websocket, user_id)
         # Update user status in DB
         db = get_db()
@@ -271,6 +289,7 @@ async def handle_chat_message(sender_id: str, sender_username: str, data: dict):
         "file_name": data.get("file_name"),
         "file_size": data.get("file_size"),
         "reply_to": data.get("reply_to"),
+        "client_id": normalize_client_id(data.get("client_id")),
         "read_by": [],
         "delivered_to": [],
         "timestamp": datetime.utcnow(),
@@ -278,26 +297,39 @@ async def handle_chat_message(sender_id: str, sender_username: str, data: dict):
         "deleted": False
     }
     
-    result = await db.messages.insert_one(message_doc)
-    print(f"   Message saved with ID: {result.inserted_id}")
+    message_doc, created = await insert_message(db, message_doc)
+    print(f"   Message saved with ID: {message_doc['_id']}")
     
     # Build response message
     response = {
         "type": "message",
-        "id": str(result.inserted_id),
+        "id": str(message_doc["_id"]),
         "sender_id": sender_id,
         "sender_username": sender_username,
         "sender_avatar": sender.get("avatar") if sender else None,
-        "receiver_id": data.get("receiver_id"),
-        "room_id": data.get("room_id"),
-        "content": data.get("content", ""),
-        "message_type": data.get("message_type", "text"),
-        "file_id": data.get("file_id"),
-        "file_name": data.get("file_name"),
-        "file_size": data.get("file_size"),
-        "reply_to": data.get("reply_to"),
+        "receiver_id": message_doc.get("receiver_id"),
+        "room_id": message_doc.get("room_id"),
+        "content": message_doc.get("content", ""),
+        "message_type": message_doc.get("message_type", "text"),
+        "file_id": message_doc.get("file_id"),
+        "file_name": message_doc.get("file_name"),
+        "file_size": message_doc.get("file_size"),
+        "reply_to": message_doc.get("reply_to"),
+        "reply_preview": await get_reply_preview(db, message_doc),
+        "client_id": message_doc.get("client_id"),
         "timestamp": message_doc["timestamp"].isoformat()
     }
+    file_preview = (await resolve_file_previews(db, [message_doc.get("file_id")])).get(message_doc.get("file_id"))
+    if file_preview:
+        response.update(file_preview)
+    
+    if not created:
+        # Retried send - echo the original back to the sender only, no second fan-out
+        await manager.send_personal(sender_id, response)
+        print("   ↩️ Duplicate send, echoed original to sender")
+        return
+    
+    await index_message(db, message_doc)
     
     if data.get("receiver_id"):
         # Direct message - send to receiver and echo back to sender
@@ -361,12 +393,14 @@ async def handle_call_offer(caller_id: str, caller_username: str, data: dict):
     
     # Use provided call_id or generate one
     call_id = data.get("call_id") or str(uuid.uuid4())
-    call_manager.create_call(call_id, caller_id, callee_id, room_id, call_type)
+    call = call_manager.create_call(call_id, caller_id, callee_id, room_id, call_type, caller_username)
     
     offer_message = create_offer_message(call_id, caller_id, caller_username, sdp, call_type)
     
     if callee_id:
-        await manager.send_personal(callee_id, offer_message)
+        await relay(callee_id, offer_message)
+        if manager.is_online(callee_id):
+            observe_setup(call, "time_to_ring")
     elif room_id:
         await manager.broadcast_to_room(room_id, offer_message, exclude_user=caller_id)
 
@@ -376,19 +410,18 @@ async def handle_call_answer(answerer_id: str, data: dict):
     call_id = data.get("call_id")
     sdp = data.get("sdp")
     
-    call_manager.join_call(call_id, answerer_id)
-    
-    call = call_manager.get_call(call_id)
+    call = call_manager.join_call(call_id, answerer_id)
     if call:
+        observe_setup(call, "time_to_answer")
         answer_message = create_answer_message(call_id, answerer_id, sdp)
         
         # Send to caller or all participants
         if call.get("callee_id"):
-            await manager.send_personal(call["caller_id"], answer_message)
+            await relay(call["caller_id"], answer_message)
         else:
             for participant in call["participants"]:
                 if participant != answerer_id:
-                    await manager.send_personal(participant, answer_message)
+                    await relay(participant, answer_message)
 
 
 async def handle_ice_candidate(user_id: str, data: dict):
@@ -398,26 +431,100 @@ async def handle_ice_candidate(user_id: str, data: dict):
     
     call = call_manager.get_call(call_id)
     if call:
-        ice_message = create_ice_candidate_message(call_id, user_id, candidate)
+        if candidate is not None:
+            observe_setup(call, "time_to_first_ice")
+        
+        # A null candidate marks the end of the sender's gathering
+        end_of_candidates = candidate is None or data.get("end_of_candidates", False)
+        
+        # The callee is rung before joining, so include it for early candidates
+        recipients = set(call["participants"])
+        if call.get("callee_id"):
+            recipients.add(call["callee_id"])
+        recipients.discard(user_id)
+        
+        for participant in recipients:
+            await ice_batcher.add(
+                (call_id, user_id, participant),
+                create_ice_candidates_message(call_id, user_id),
+                candidate,
+                call,
+                end_of_candidates
+            )
+
+
+async def handle_group_call_message(websocket: WebSocket, user_id: str, username: str, data: dict):
+    """Handle group call start/join and relay mesh signaling between participants"""
+    msg_type = data.get("type")
+    room_id = data.get("room_id")
+    
+    if msg_type == "group_call_start":
+        call_id = await start_group_call(user_id, username, room_id, data.get("call_type", "video"), data.get("call_id"))
+        # Send confirmation to initiator
+        await websocket.send_json({
+            "type": "group_call_started",
+            "room_id": room_id,
+            "call_id": call_id
+        })
+    
+    elif msg_type == "group_call_join":
+        call = await join_group_call(user_id, username, room_id)
+        # Send call info to joiner
+        await websocket.send_json({
+            "type": "group_call_joined",
+            "room_id": room_id,
+            "call_id": call["call_id"],
+            "participants": list(call["participants"])
+        })
+    
+    else:
+        await relay_group_signal(user_id, username, data)
+
+
+async def stream_arise_reply(websocket: WebSocket, user_id: str, request_id: str, data: dict):
+    """Stream an Arise reply as arise_delta frames, finishing with arise_done"""
+    try:
+        message = AriseMessage.model_validate(data)
+        metrics.inc("ai.streams.ws")
+        
+        if data.get("conv_id"):
+            conversation = await get_user_conversation(data["conv_id"], user_id)
+            deltas = stream_conversation_reply(user_id, conversation, message.content)
+        else:
+            deltas = stream_chat_reply(user_id, llm.default_model, message.conversation_history or [], arise_prompt(message))
+        
+        parts = []
+        async for delta in deltas:
+            parts.append(delta)
+            await websocket.send_json({"type": "arise_delta", "request_id": request_id, "delta": delta})
         
-        for participant in call["participants"]:
-            if participant != user_id:
-                await manager.send_personal(participant, ice_message)
+        await websocket.send_json({"type": "arise_done", "request_id": request_id, "response": "".join(parts)})
+    
+    except asyncio.CancelledError:
+        try:
+            await websocket.send_json({"type": "arise_cancelled", "request_id": request_id})
+        except Exception:
+            pass
+        raise
+    except AIBusy as e:
+        # Same status as the SSE endpoint so clients back off instead of retrying
+        try:
+            await websocket.send_json({"type": "arise_error", "request_id": request_id, "error": str(e), "status": 429})
+        except Exception:
+            pass
+    except Exception as e:
+        error = e.detail if isinstance(e, HTTPException) else f"I encountered an issue: {str(e)}"
+        try:
+            await websocket.send_json({"type": "arise_error", "request_id": request_id, "error": error})
+        except Exception:
+            pass
 
 
 async def handle_call_end(user_id: str, data: dict):
     """Handle call end"""
     call_id = data.get("call_id")
     
-    call = call_manager.get_call(call_id)
-    if call:
-        end_message = create_call_ended_message(call_id, user_id)
-        
-        for participant in list(call["participants"]):
-            if participant != user_id:
-                await manager.send_personal(participant, end_message)
-        
-        call_manager.end_call(call_id)
+    await finish_call(call_id, user_id)
 
 
 @app.get("/api/health")
@@ -426,61 +533,45 @@ async def health_check():
     return {"status": "healthy", "app": settings.APP_NAME}
 
 
-# NexusChat Auto-Save endpoint
-NEXUSCHAT_BASE = pathlib.Path("C:/NexusChat")
+@app.get("/api/metrics")
+async def get_metrics(current_user: dict = Depends(get_current_user)):
+    """In-process performance counters, gauges and histograms (operators only)"""
+    if current_user["user_id"] not in settings.METRICS_USER_IDS:
+        raise HTTPException(status_code=403, detail="Not authorized to view metrics")
+    return metrics.snapshot()
+
+
+# NexusChat Auto-Save endpoints
+class AutoSaveItem(BaseModel):
+    file_id: str
+    file_type: str = "file"
+
+
+class AutoSaveBatchRequest(BaseModel):
+    files: List[AutoSaveItem] = Field(..., max_length=100)
+
+
+@app.post("/api/files/auto-save/batch")
+async def auto_save_files(request: AutoSaveBatchRequest):
+    """Queue auto-save of many files to the AUTO_SAVE_DIR folders"""
+    try:
+        results = await queue_batch_export([item.model_dump() for item in request.files])
+        return {"success": True, "results": results}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
 
 @app.post("/api/files/auto-save/{file_id}")
 async def auto_save_file(file_id: str, file_type: str = "file"):
     """
-    Auto-save a file to C:/NexusChat folders
+    Auto-save a file to the AUTO_SAVE_DIR folders in the background
     Creates the folder structure if it doesn't exist:
-    - C:/NexusChat/Images/
-    - C:/NexusChat/Videos/
-    - C:/NexusChat/Files/
+    - <AUTO_SAVE_DIR>/Images/
+    - <AUTO_SAVE_DIR>/Videos/
+    - <AUTO_SAVE_DIR>/Files/
     """
     try:
-        db = await get_db()
-        from bson import ObjectId
-        import gridfs
-        
-        # Determine folder based on file type
-        if file_type == "image":
-            folder = NEXUSCHAT_BASE / "Images"
-        elif file_type == "video":
-            folder = NEXUSCHAT_BASE / "Videos"
-        else:
-            folder = NEXUSCHAT_BASE / "Files"
-        
-        # Create folders if they don't exist
-        folder.mkdir(parents=True, exist_ok=True)
-        
-        # Get file from GridFS
-        fs = gridfs.GridFS(db)
-        if len(file_id) == 24:
-            file_obj = fs.get(ObjectId(file_id))
-        else:
-            # Try to find by filename
-            file_obj = fs.find_one({"filename": file_id})
-            if file_obj:
-                file_obj = fs.get(file_obj._id)
-        
-        if not file_obj:
-            return {"success": False, "error": "File not found"}
-        
-        # Get filename
-        filename = file_obj.filename or f"file_{file_id}"
-        
-        # Check if file already exists
-        target_path = folder / filename
-        if target_path.exists():
-            return {"success": True, "message": "File already exists", "path": str(target_path)}
-        
-        # Save the file
-        with open(target_path, 'wb') as f:
-            f.write(file_obj.read())
-        
-        return {"success": True, "message": "File saved", "path": str(target_path)}
-    
+        return await queue_export(file_id, file_type)
     except Exception as e:
         return {"success": False, "error": str(e)}
 
@@ -489,14 +580,12 @@ async def auto_save_file(file_id: str, file_type: str = "file"):
 async def init_nexuschat_folders():
     """Initialize NexusChat folder structure"""
     try:
-        (NEXUSCHAT_BASE / "Images").mkdir(parents=True, exist_ok=True)
-        (NEXUSCHAT_BASE / "Videos").mkdir(parents=True, exist_ok=True)
-        (NEXUSCHAT_BASE / "Files").mkdir(parents=True, exist_ok=True)
+        folders = await init_folders()
         return {
             "success": True, 
             "message": "Folders created", 
-            "path": str(NEXUSCHAT_BASE),
-            "folders": ["Images", "Videos", "Files"]
+            "path": str(auto_save_base()),
+            "folders": folders
         }
     except Exception as e:
         return {"success": False, "error": str(e)}
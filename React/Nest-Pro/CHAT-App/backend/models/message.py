@@ -11,6 +11,7 @@ class MessageCreate(BaseModel):
     file_name: Optional[str] = None
     file_size: Optional[int] = None
     reply_to: Optional[str] = None
+    client_id: Optional[str] = Field(None, min_length=1, max_length=64)  # Client-generated id for idempotent retries
 
 class MessageResponse(BaseModel):
     id: str
@@ -25,6 +26,10 @@ class MessageResponse(BaseModel):
     file_name: Optional[str] = None
     file_size: Optional[int] = None
     reply_to: Optional[str] = None
+    client_id: Optional[str] = None
+    reply_preview: Optional[dict] = None  # sender_name, snippet, message_type of the quoted message
+    thumbnails: Optional[dict] = None  # size name -> thumbnail file_id
+    placeholder: Optional[str] = None  # Tiny blurred data URI shown while media loads
     read_by: List[str] = []
     delivered_to: List[str] = []
     starred_by: List[str] = []
@@ -42,6 +47,7 @@ class MessageInDB(BaseModel):
     file_name: Optional[str] = None
     file_size: Optional[int] = None
     reply_to: Optional[str] = None
+    client_id: Optional[str] = None
     read_by: List[str] = []
     delivered_to: List[str] = []
     starred_by: List[str] = []
@@ -41,6 +41,9 @@ class UserSettings(BaseModel):
     profile_photo_visibility: str = "everyone"  # everyone, contacts, nobody
     about_visibility: str = "everyone"  # everyone, contacts, nobody
     read_receipts: bool = True
+    
+    # Arise
+    arise_response_cache: bool = True  # reuse replies to identical prompts
 
 # Request Models
 class UserCreate(BaseModel):
@@ -76,6 +79,7 @@ class SettingsUpdate(BaseModel):
     profile_photo_visibility: Optional[str] = None
     about_visibility: Optional[str] = None
     read_receipts: Optional[bool] = None
+    arise_response_cache: Optional[bool] = None
 
 # Response Models
 class UserResponse(BaseModel):
@@ -1,15 +1,15 @@
 from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
-import google.generativeai as genai
-from config import settings
+from typing import AsyncIterator, Optional, List
+import json
 from utils.auth import get_current_user
+from services.ai_executor import ai_executor, AIBusy
+from services.llm import llm
+from services.ai_cache import response_key, cache_enabled_for, get_cached_reply, store_reply
+from services.metrics import metrics
 
 router = APIRouter(prefix="/api/arise", tags=["Arise AI"])
-gemini_model = 'gemini-2.5-flash' 
-# Configure Gemini
-if settings.GEMINI_API_KEY:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
 
 class AriseMessage(BaseModel):
     content: str
@@ -32,6 +32,79 @@ You help users with:
 Be friendly, helpful, and concise. Use emojis occasionally to be engaging.
 When helping with collaboration, provide structured and actionable suggestions."""
 
+NO_API_KEY_RESPONSE = "Hi! I'm Arise, your AI assistant. 🤖 To enable my full capabilities, please configure the GEMINI_API_KEY in the backend settings. For now, I can provide basic responses!"
+
+
+def user_prompt(message: AriseMessage) -> str:
+    """The user's message with its optional context"""
+    if message.context:
+        return f"Context: {message.context}\n\nUser: {message.content}"
+    return message.content
+
+
+def arise_prompt(message: AriseMessage) -> str:
+    """System prompt plus the user's message and optional context"""
+    return f"{ARISE_SYSTEM_PROMPT}\n\n{user_prompt(message)}"
+
+
+async def generate_reply(user_id: str, model_name: str, history: List[dict], system: str, prompt: str) -> str:
+    """Complete Arise reply, served from the response cache when an identical request was answered recently"""
+    use_cache = await cache_enabled_for(user_id)
+    if use_cache:
+        key = response_key(model_name, system, history, prompt)
+        cached = get_cached_reply(key)
+        if cached is not None:
+            return cached
+    else:
+        metrics.inc("ai_cache.bypassed")
+    
+    reply = await ai_executor.run(user_id, llm.generate, model_name, history, f"{system}\n\n{prompt}")
+    
+    if use_cache:
+        store_reply(key, reply)
+    return reply
+
+
+async def stream_chat_reply(user_id: str, model_name: str, history: List[dict], prompt: str) -> AsyncIterator[str]:
+    """Yield Arise reply text as the provider produces it"""
+    if not llm.available:
+        yield NO_API_KEY_RESPONSE
+        return
+    
+    # The provider call runs in the worker thread too, as part of the chunk iterator
+    async for text in ai_executor.stream(user_id, lambda: llm.stream(model_name, history, prompt)):
+        yield text
+
+
+def sse_event(data: dict, event: Optional[str] = None) -> str:
+    """Format one Server-Sent Events message"""
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
+
+
+async def sse_stream(deltas: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Forward deltas as SSE 'delta' events, then a 'done' event with the full
+    reply. If the client disconnects, the response task is cancelled, which
+    closes the delta generator and stops the upstream stream.
+    """
+    parts = []
+    try:
+        async for delta in deltas:
+            parts.append(delta)
+            yield sse_event({"delta": delta})
+    except AIBusy as e:
+        yield sse_event({"error": str(e), "status": 429}, event="error")
+        return
+    except Exception as e:
+        yield sse_event({"error": f"I encountered an issue: {str(e)}"}, event="error")
+        return
+    yield sse_event({"response": "".join(parts)}, event="done")
+
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
 @router.post("/chat", response_model=AriseResponse)
 async def chat_with_arise(
     message: AriseMessage,
@@ -39,44 +112,45 @@ async def chat_with_arise(
 ):
     """Send a message to Arise AI"""
     
-    if not settings.GEMINI_API_KEY:
+    if not llm.available:
         # Fallback response if no API key
         return AriseResponse(
-            response="Hi! I'm Arise, your AI assistant. 🤖 To enable my full capabilities, please configure the GEMINI_API_KEY in the backend settings. For now, I can provide basic responses!",
+            response=NO_API_KEY_RESPONSE,
             suggestions=["Configure API key", "Learn more about Arise"]
         )
     
     try:
-        # Build conversation
-        model = genai.GenerativeModel(gemini_model)
-        
-        # Build chat history
-        history = []
-        for msg in message.conversation_history or []:
-            role = "user" if msg.get("role") == "user" else "model"
-            history.append({"role": role, "parts": [msg.get("content", "")]})
-        
-        chat = model.start_chat(history=history)
-        
-        # Add context if provided
-        prompt = message.content
-        if message.context:
-            prompt = f"Context: {message.context}\n\nUser: {message.content}"
-        
-        # Get response
-        response = chat.send_message(f"{ARISE_SYSTEM_PROMPT}\n\n{prompt}")
+        # Get response (off the event loop)
+        response = await generate_reply(
+            current_user["user_id"], llm.default_model,
+            message.conversation_history or [], ARISE_SYSTEM_PROMPT, user_prompt(message)
+        )
         
         return AriseResponse(
-            response=response.text,
+            response=response,
             suggestions=[]
         )
         
+    except AIBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         return AriseResponse(
             response=f"I encountered an issue: {str(e)}. Let me try to help you anyway! What would you like to know?",
             suggestions=["Try again", "Ask a different question"]
         )
 
+@router.post("/chat/stream")
+async def stream_chat_with_arise(
+    message: AriseMessage,
+    current_user: dict = Depends(get_current_user)
+):
+    """Send a message to Arise AI and stream the reply as Server-Sent Events"""
+    metrics.inc("ai.streams.sse")
+    deltas = stream_chat_reply(
+        current_user["user_id"], llm.default_model, message.conversation_history or [], arise_prompt(message)
+    )
+    return StreamingResponse(sse_stream(deltas), media_type="text/event-stream", headers=SSE_HEADERS)
+
 @router.post("/collaborate")
 async def collaborate_mode(
     message: AriseMessage,
@@ -92,26 +166,29 @@ async def collaborate_mode(
 
 Format your response with clear sections using markdown."""
     
-    if not settings.GEMINI_API_KEY:
+    if not llm.available:
         return AriseResponse(
             response="🤝 **Collaboration Mode**\n\nTo enable AI-powered collaboration, please configure the GEMINI_API_KEY.\n\n**Manual Collaboration Tips:**\n1. Break down your idea into smaller parts\n2. Identify key stakeholders\n3. Set clear milestones",
             suggestions=["Configure API", "View collaboration templates"]
         )
     
     try:
-        model = genai.GenerativeModel(gemini_model)
-        
-        prompt = f"{ARISE_SYSTEM_PROMPT}\n\n{collaboration_prompt}\n\nTopic: {message.content}"
+        prompt = f"Topic: {message.content}"
         if message.context:
             prompt += f"\n\nAdditional Context: {message.context}"
         
-        response = model.generate_content(prompt)
+        response = await generate_reply(
+            current_user["user_id"], llm.default_model, [],
+            f"{ARISE_SYSTEM_PROMPT}\n\n{collaboration_prompt}", prompt
+        )
         
         return AriseResponse(
-            response=response.text,
+            response=response,
             suggestions=["Expand on this", "Create action items", "Share with team"]
         )
         
+    except AIBusy as e:
+        raise HTTPException(status_code=429, detail=str(e))
     except Exception as e:
         return AriseResponse(
             response=f"Error in collaboration mode: {str(e)}",
@@ -128,7 +205,7 @@ from datetime import datetime
 
 class ConversationCreate(BaseModel):
     title: Optional[str] = "New Chat"
-    model: Optional[str] = gemini_model
+    model: Optional[str] = llm.default_model
 
 class ConversationUpdate(BaseModel):
     title: Optional[str] = None
@@ -152,7 +229,7 @@ async def get_conversations(current_user: dict = Depends(get_current_user)):
             result.append({
                 "id": str(conv["_id"]),
                 "title": conv.get("title", "New Chat"),
-                "model": conv.get("model", gemini_model),
+                "model": conv.get("model", llm.default_model),
                 "created_at": conv.get("created_at").isoformat() if conv.get("created_at") else None,
                 "updated_at": conv.get("updated_at").isoformat() if conv.get("updated_at") else None
             })
@@ -212,7 +289,7 @@ async def get_conversation(
         return {
             "id": str(conversation["_id"]),
             "title": conversation.get("title", "New Chat"),
-            "model": conversation.get("model", gemini_model),
+            "model": conversation.get("model", llm.default_model),
             "messages": conversation.get("messages", []),
             "created_at": conversation.get("created_at").isoformat() if conversation.get("created_at") else None,
             "updated_at": conversation.get("updated_at").isoformat() if conversation.get("updated_at") else None
@@ -295,6 +372,61 @@ async def add_message(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def get_user_conversation(conv_id: str, user_id: str) -> dict:
+    conversation = await get_db().ai_conversations.find_one({
+        "_id": ObjectId(conv_id),
+        "user_id": user_id
+    })
+    
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    return conversation
+
+
+async def save_conversation_turn(conversation: dict, user_text: str, ai_text: str):
+    """Append a user message and the AI reply, titling the conversation on its first turn"""
+    user_msg = {
+        "role": "user",
+        "content": user_text,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    ai_msg = {
+        "role": "assistant",
+        "content": ai_text,
+        "timestamp": datetime.utcnow().isoformat()
+    }
+    
+    update_ops = {
+        "$push": {"messages": {"$each": [user_msg, ai_msg]}},
+        "$set": {"updated_at": datetime.utcnow()}
+    }
+    
+    if len(conversation.get("messages", [])) == 0:
+        update_ops["$set"]["title"] = user_text[:30] + ("..." if len(user_text) > 30 else "")
+    
+    await get_db().ai_conversations.update_one(
+        {"_id": conversation["_id"]},
+        update_ops
+    )
+
+
+async def stream_conversation_reply(user_id: str, conversation: dict, content: str) -> AsyncIterator[str]:
+    """Stream a reply within a stored conversation, saving the turn once the reply is complete"""
+    parts = []
+    async for delta in stream_chat_reply(
+        user_id,
+        conversation.get("model", llm.default_model),
+        conversation.get("messages", [])[-10:],
+        f"{ARISE_SYSTEM_PROMPT}\n\n{content}"
+    ):
+        parts.append(delta)
+        yield delta
+    
+    # Only reached when the stream completed - cancelled replies are not stored
+    await save_conversation_turn(conversation, content, "".join(parts))
+
+
 @router.post("/conversations/{conv_id}/chat")
 async def chat_in_conversation(
     conv_id: str,
@@ -303,64 +435,45 @@ async def chat_in_conversation(
 ):
     """Send a message and get AI response, storing both in the conversation"""
     try:
-        # Get conversation
-        conversation = await get_db().ai_conversations.find_one({
-            "_id": ObjectId(conv_id),
-            "user_id": current_user["user_id"]
-        })
-        
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        
-        # Add user message
-        user_msg = {
-            "role": "user",
-            "content": message.content,
-            "timestamp": datetime.utcnow().isoformat()
-        }
+        conversation = await get_user_conversation(conv_id, current_user["user_id"])
         
         # Get AI response
         ai_response_text = "I'm here to help!"
         
-        if settings.GEMINI_API_KEY:
+        if llm.available:
             try:
-                model = genai.GenerativeModel(conversation.get("model", gemini_model))
-                history = []
-                for msg in conversation.get("messages", [])[-10:]:
-                    role = "user" if msg.get("role") == "user" else "model"
-                    history.append({"role": role, "parts": [msg.get("content", "")]})
-                
-                chat = model.start_chat(history=history)
-                response = chat.send_message(f"{ARISE_SYSTEM_PROMPT}\n\n{message.content}")
-                ai_response_text = response.text
+                ai_response_text = await generate_reply(
+                    current_user["user_id"],
+                    conversation.get("model", llm.default_model),
+                    conversation.get("messages", [])[-10:],
+                    ARISE_SYSTEM_PROMPT,
+                    message.content
+                )
+            except AIBusy as e:
+                raise HTTPException(status_code=429, detail=str(e))
             except Exception as e:
                 ai_response_text = f"I encountered an issue: {str(e)}"
         
-        # Create AI message
-        ai_msg = {
-            "role": "assistant",
-            "content": ai_response_text,
-            "timestamp": datetime.utcnow().isoformat()
-        }
-        
-        # Update title if first message
-        update_ops = {
-            "$push": {"messages": {"$each": [user_msg, ai_msg]}},
-            "$set": {"updated_at": datetime.utcnow()}
-        }
-        
-        if len(conversation.get("messages", [])) == 0:
-            update_ops["$set"]["title"] = message.content[:30] + ("..." if len(message.content) > 30 else "")
-        
-        await get_db().ai_conversations.update_one(
-            {"_id": ObjectId(conv_id)},
-            update_ops
-        )
+        await save_conversation_turn(conversation, message.content, ai_response_text)
         
         return AriseResponse(
             response=ai_response_text,
             suggestions=[]
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+
+@router.post("/conversations/{conv_id}/chat/stream")
+async def stream_chat_in_conversation(
+    conv_id: str,
+    message: AriseMessage,
+    current_user: dict = Depends(get_current_user)
+):
+    """Stream the AI reply as Server-Sent Events, storing the turn once it completes"""
+    conversation = await get_user_conversation(conv_id, current_user["user_id"])
+    metrics.inc("ai.streams.sse")
+    deltas = stream_conversation_reply(current_user["user_id"], conversation, message.content)
+    return StreamingResponse(sse_stream(deltas), media_type="text/event-stream", headers=SSE_HEADERS)
@@ -15,6 +15,9 @@ router = APIRouter(prefix="/api/archive", tags=["Archive"])
 # In-memory OTP storage (in production, use Redis or database)
 otp_storage = {}
 
+# How often expired OTPs are evicted
+OTP_SWEEP_INTERVAL_SECONDS = 60
+
 def hash_pin(pin: str) -> str:
     """Hash a 4-digit PIN"""
     return hashlib.sha256(pin.encode()).hexdigest()
@@ -24,6 +27,13 @@ def generate_otp() -> str:
     return ''.join(random.choices(string.digits, k=6))
 
 
+async def sweep_expired_otps():
+    """Evict OTPs that were never used before expiring"""
+    now = datetime.utcnow()
+    for user_id in [uid for uid, entry in otp_storage.items() if entry["expires"] < now]:
+        otp_storage.pop(user_id, None)
+
+
 @router.get("")
 async def get_archived_chats(current_user: dict = Depends(get_current_user)):
     """Get list of archived chat IDs"""
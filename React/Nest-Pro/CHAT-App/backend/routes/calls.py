@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
 from bson import ObjectId
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
+from config import settings
 from utils.auth import get_current_user
 from utils.db import get_db
+from utils.pagination import parse_cursor, InvalidCursor
+from services.metrics import metrics
+from services.webrtc import call_manager
+from services.websocket import manager
+from services.call_log import record_call, get_history_page, count_missed, hide_calls
 
 router = APIRouter(prefix="/api/calls", tags=["Calls"])
 
@@ -14,7 +20,8 @@ class CallLogCreate(BaseModel):
     callee_id: str
     call_type: str  # audio, video
     status: str  # completed, missed, rejected, cancelled
-    duration: int = 0  # in seconds
+    duration: int = Field(0, ge=0)  # in seconds
+    call_id: Optional[str] = None  # Signaling id, so a call the server already recorded isn't logged twice
 
 
 class CallLog(BaseModel):
@@ -29,88 +36,123 @@ class CallLog(BaseModel):
     timestamp: datetime
 
 
+class CallStatsSample(BaseModel):
+    """One client-side RTCPeerConnection.getStats() summary"""
+    timestamp: datetime
+    rtt_ms: Optional[float] = None
+    jitter_ms: Optional[float] = None
+    packets_lost: Optional[int] = None
+    fraction_lost: Optional[float] = None
+    bitrate_kbps: Optional[float] = None
+    frames_per_second: Optional[float] = None
+
+
+class CallStatsBatch(BaseModel):
+    samples: List[CallStatsSample] = Field(..., min_length=1, max_length=120)
+
+
+# Sample fields also aggregated into in-process histograms
+QUALITY_HISTOGRAMS = {
+    "rtt_ms": "call_quality.rtt_ms",
+    "jitter_ms": "call_quality.jitter_ms"
+}
+
+
 @router.get("")
-async def get_call_history(current_user: dict = Depends(get_current_user)):
-    """Get user's call history"""
+async def get_call_history(
+    limit: int = 50,
+    before: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get user's call history, paginated by (timestamp, id) cursor"""
+    db = get_db()
+    
+    try:
+        cursor = parse_cursor(before)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return await get_history_page(db, current_user["user_id"], limit, cursor)
+
+
+@router.get("/counts")
+async def get_call_counts(current_user: dict = Depends(get_current_user)):
+    """Missed call counts for the calls badge"""
     db = get_db()
     user_id = current_user["user_id"]
     
-    # Get calls where user is either caller or callee
-    calls = await db.call_history.find({
-        "$or": [
-            {"caller_id": user_id},
-            {"callee_id": user_id}
-        ]
-    }).sort("timestamp", -1).limit(50).to_list(50)
-    
-    # Format response
-    result = []
-    for call in calls:
-        result.append({
-            "id": str(call["_id"]),
-            "caller_id": call["caller_id"],
-            "caller_name": call.get("caller_name", "Unknown"),
-            "callee_id": call["callee_id"],
-            "callee_name": call.get("callee_name", "Unknown"),
-            "call_type": call["call_type"],
-            "status": call["status"],
-            "duration": call.get("duration", 0),
-            "timestamp": call["timestamp"].isoformat(),
-            "is_outgoing": call["caller_id"] == user_id
-        })
-    
-    return result
+    user = await db.users.find_one({"_id": ObjectId(user_id)}, {"calls_seen_at": 1})
+    seen_at = user.get("calls_seen_at") if user else None
+    
+    return {
+        "missed": await count_missed(db, user_id),
+        "missed_unseen": await count_missed(db, user_id, since=seen_at)
+    }
+
+
+@router.post("/seen")
+async def mark_calls_seen(current_user: dict = Depends(get_current_user)):
+    """Reset the missed calls badge"""
+    db = get_db()
+    await db.users.update_one(
+        {"_id": ObjectId(current_user["user_id"])},
+        {"$set": {"calls_seen_at": datetime.utcnow()}}
+    )
+    return {"message": "Calls marked as seen"}
 
 
 @router.post("")
 async def create_call_log(call_data: CallLogCreate, current_user: dict = Depends(get_current_user)):
-    """Create a call log entry"""
+    """
+    Create a call log entry. Calls signaled over the WebSocket are recorded by
+    the server; this is kept for clients that place calls some other way.
+    """
     db = get_db()
     user_id = current_user["user_id"]
     
-    # Get caller name
-    caller = await db.users.find_one({"_id": ObjectId(user_id)})
-    caller_name = caller.get("username", "Unknown") if caller else "Unknown"
-    
-    # Get callee name
-    callee = await db.users.find_one({"_id": ObjectId(call_data.callee_id)})
-    callee_name = callee.get("username", "Unknown") if callee else "Unknown"
-    
-    call_log = {
-        "caller_id": user_id,
-        "caller_name": caller_name,
-        "callee_id": call_data.callee_id,
-        "callee_name": callee_name,
-        "call_type": call_data.call_type,
-        "status": call_data.status,
-        "duration": call_data.duration,
-        "timestamp": datetime.utcnow()
-    }
+    call_id = call_data.call_id
+    if call_id:
+        existing = await db.call_history.find_one({"call_id": call_id}, {"participants": 1})
+        if existing and user_id in existing.get("participants", []):
+            # Already recorded by the server during signaling
+            return {"id": str(existing["_id"]), "message": "Call log created"}
+        if existing:
+            call_id = None  # Someone else's call id; log this one on its own
     
-    result = await db.call_history.insert_one(call_log)
+    now = datetime.utcnow()
+    answered_at = now - timedelta(seconds=call_data.duration) if call_data.duration else None
+    
+    log_id = await record_call(
+        call_id=call_id,
+        caller_id=user_id,
+        caller_name=current_user.get("username"),
+        callee_id=call_data.callee_id,
+        call_type=call_data.call_type,
+        status=call_data.status,
+        started_at=answered_at or now,
+        answered_at=answered_at,
+        ended_at=now,
+        participants=[user_id, call_data.callee_id],
+        missed_by=[call_data.callee_id] if call_data.status == "missed" else [],
+        replace=False
+    )
     
     return {
-        "id": str(result.inserted_id),
+        "id": log_id,
         "message": "Call log created"
     }
 
 
 @router.delete("/{call_id}")
 async def delete_call_log(call_id: str, current_user: dict = Depends(get_current_user)):
-    """Delete a call log entry"""
+    """Delete a call log entry from the user's history"""
     db = get_db()
-    user_id = current_user["user_id"]
     
-    # Only allow deletion if user is part of the call
-    result = await db.call_history.delete_one({
-        "_id": ObjectId(call_id),
-        "$or": [
-            {"caller_id": user_id},
-            {"callee_id": user_id}
-        ]
-    })
+    if not ObjectId.is_valid(call_id):
+        raise HTTPException(status_code=400, detail="Invalid call log id")
     
-    if result.deleted_count == 0:
+    removed = await hide_calls(db, current_user["user_id"], [ObjectId(call_id)])
+    if removed == 0:
         raise HTTPException(status_code=404, detail="Call log not found")
     
     return {"message": "Call log deleted"}
@@ -120,13 +162,72 @@ async def delete_call_log(call_id: str, current_user: dict = Depends(get_current
 async def clear_call_history(current_user: dict = Depends(get_current_user)):
     """Clear all call history for user"""
     db = get_db()
+    await hide_calls(db, current_user["user_id"])
+    return {"message": "Call history cleared"}
+
+
+async def is_call_participant(db, call_id: str, user_id: str) -> bool:
+    """Whether the user is (or was) in the call, live or from history"""
+    call = call_manager.get_call(call_id)
+    if call:
+        return user_id in call["joined"]
+    
+    for group_call in manager.active_group_calls.values():
+        if group_call["call_id"] == call_id:
+            return user_id in group_call["joined"]
+    
+    record = await db.call_history.find_one({"call_id": call_id, "participants": user_id}, {"_id": 1})
+    return record is not None
+
+
+@router.post("/{call_id}/stats")
+async def ingest_call_stats(call_id: str, batch: CallStatsBatch, current_user: dict = Depends(get_current_user)):
+    """Store a batch of client getStats() summaries as a per-call quality time series"""
+    db = get_db()
     user_id = current_user["user_id"]
     
-    await db.call_history.delete_many({
-        "$or": [
-            {"caller_id": user_id},
-            {"callee_id": user_id}
-        ]
-    })
+    if not await is_call_participant(db, call_id, user_id):
+        raise HTTPException(status_code=404, detail="Call not found")
     
-    return {"message": "Call history cleared"}
+    samples = sorted(
+        (sample.model_dump(exclude_none=True) for sample in batch.samples),
+        key=lambda sample: sample["timestamp"]
+    )
+    for sample in samples:
+        for field, histogram in QUALITY_HISTOGRAMS.items():
+            if field in sample:
+                metrics.observe(histogram, sample[field])
+    
+    # One series document per (call, reporting user), capped to the newest samples
+    await db.call_stats.update_one(
+        {"call_id": call_id, "user_id": user_id},
+        {
+            "$push": {"samples": {"$each": samples, "$slice": -settings.CALL_STATS_MAX_SAMPLES}},
+            "$set": {"updated_at": datetime.utcnow()}
+        },
+        upsert=True
+    )
+    
+    return {"accepted": len(samples)}
+
+
+@router.get("/{call_id}/stats")
+async def get_call_stats(call_id: str, current_user: dict = Depends(get_current_user)):
+    """Quality time series reported by each participant of a call"""
+    db = get_db()
+    
+    if not await is_call_participant(db, call_id, current_user["user_id"]):
+        raise HTTPException(status_code=404, detail="Call not found")
+    
+    series = await db.call_stats.find({"call_id": call_id}).to_list(length=None)
+    
+    return [
+        {
+            "user_id": entry["user_id"],
+            "samples": [
+                {**sample, "timestamp": sample["timestamp"].isoformat()}
+                for sample in entry.get("samples", [])
+            ]
+        }
+        for entry in series
+    ]
@@ -8,8 +8,10 @@ from typing import Optional, List
 from datetime import datetime, timedelta
 from bson import ObjectId
 
-from utils.db import get_db
-from utils.auth import decode_token
+from utils.db import get_db, get_fs
+from utils.auth import decode_token, get_current_user
+from services.jobs import job_queue
+from services.storage import release_file
 
 router = APIRouter(prefix="/api", tags=["chat-actions"])
 
@@ -87,11 +89,11 @@ async def get_chat_pins(chat_id: str, db=Depends(get_db)):
     try:
         now = datetime.utcnow()
         
-        # Remove expired pins
-        await db.pinned_messages.delete_many({"expires_at": {"$lt": now}})
-        
-        # Get active pins
-        pins = await db.pinned_messages.find({"chat_id": chat_id}).to_list(100)
+        # Get active pins (expired pins are removed by a TTL index)
+        pins = await db.pinned_messages.find({
+            "chat_id": chat_id,
+            "expires_at": {"$gt": now}
+        }).to_list(100)
         
         # Convert ObjectId to string
         for pin in pins:
@@ -107,11 +109,17 @@ async def get_chat_pins(chat_id: str, db=Depends(get_db)):
 # ============ CHAT ACTION ENDPOINTS ============
 
 @router.post("/chats/{chat_id}/action")
-async def chat_action(chat_id: str, request: ChatActionRequest, db=Depends(get_db)):
+async def chat_action(
+    chat_id: str,
+    request: ChatActionRequest,
+    db=Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
     """Perform action on a chat (archive, pin-to-top, mark-unread, clear, delete)"""
     try:
         action = request.action
         now = datetime.utcnow()
+        job = None
         
         if action == "archive":
             await db.chat_states.update_one(
@@ -150,22 +158,26 @@ async def chat_action(chat_id: str, request: ChatActionRequest, db=Depends(get_d
                 upsert=True
             )
         elif action == "clear_messages":
-            # Clear all messages in the chat (soft delete)
-            await db.messages.update_many(
-                {"$or": [{"chat_id": chat_id}, {"receiver_id": chat_id}, {"sender_id": chat_id}]},
-                {"$set": {"deleted": True, "deleted_at": now}}
+            # Clear all messages in the chat (soft delete) in the background
+            job = await job_queue.enqueue(
+                "clear_chat_messages", {"chat_id": chat_id},
+                owner_id=current_user["user_id"], notify_room=chat_id
             )
         elif action == "delete_chat":
-            # Delete chat permanently - remove messages and chat state
-            await db.messages.delete_many(
-                {"$or": [{"chat_id": chat_id}, {"receiver_id": chat_id}, {"sender_id": chat_id}]}
+            # Delete chat permanently - messages are removed in the background
+            job = await job_queue.enqueue(
+                "delete_chat_messages", {"chat_id": chat_id},
+                owner_id=current_user["user_id"], notify_room=chat_id
             )
             await db.chat_states.delete_one({"chat_id": chat_id})
             await db.contacts.delete_many({"contact_id": chat_id})
         else:
             raise HTTPException(status_code=400, detail="Invalid action")
         
-        return {"success": True, "action": action}
+        result = {"success": True, "action": action}
+        if job:
+            result["job_id"] = str(job["_id"])
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -201,10 +213,23 @@ async def get_archived_chats(db=Depends(get_db)):
 
 # ============ DELETED FILES ENDPOINTS ============
 
+async def is_file_owner(db, file_id: str, user_id: str) -> bool:
+    """Only the uploader may trash or restore a file"""
+    if not ObjectId.is_valid(file_id):
+        return False
+    return await db["fs.files"].find_one(
+        {"_id": ObjectId(file_id), "metadata.uploaded_by": user_id},
+        {"_id": 1}
+    ) is not None
+
+
 @router.post("/files/{file_id}/soft-delete")
-async def soft_delete_file(file_id: str, db=Depends(get_db)):
+async def soft_delete_file(file_id: str, db=Depends(get_db), current_user: dict = Depends(get_current_user)):
     """Soft delete a file (30-day retention)"""
     try:
+        if not await is_file_owner(db, file_id, current_user["user_id"]):
+            raise HTTPException(status_code=404, detail="File not found")
+        
         now = datetime.utcnow()
         permanent_delete_at = now + timedelta(days=30)
         
@@ -212,6 +237,7 @@ async def soft_delete_file(file_id: str, db=Depends(get_db)):
             {"file_id": file_id},
             {"$set": {
                 "file_id": file_id,
+                "owner_id": current_user["user_id"],
                 "deleted_at": now,
                 "permanent_delete_at": permanent_delete_at
             }},
@@ -219,22 +245,24 @@ async def soft_delete_file(file_id: str, db=Depends(get_db)):
         )
         
         return {"success": True, "message": "File moved to trash", "restore_until": permanent_delete_at.isoformat()}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/files/{file_id}/restore")
-async def restore_file(file_id: str, db=Depends(get_db)):
+async def restore_file(file_id: str, db=Depends(get_db), current_user: dict = Depends(get_current_user)):
     """Restore a soft-deleted file"""
     try:
-        deleted = await db.deleted_files.find_one({"file_id": file_id})
+        deleted = await db.deleted_files.find_one({"file_id": file_id, "owner_id": current_user["user_id"]})
         if not deleted:
             raise HTTPException(status_code=404, detail="File not in trash")
         
         if datetime.utcnow() > deleted.get("permanent_delete_at", datetime.utcnow()):
             raise HTTPException(status_code=410, detail="File has been permanently deleted")
         
-        await db.deleted_files.delete_one({"file_id": file_id})
+        await db.deleted_files.delete_one({"_id": deleted["_id"]})
         return {"success": True, "message": "File restored"}
     except HTTPException:
         raise
@@ -243,16 +271,16 @@ async def restore_file(file_id: str, db=Depends(get_db)):
 
 
 @router.get("/files/deleted")
-async def get_deleted_files(db=Depends(get_db)):
-    """Get all deleted files (not yet permanently deleted)"""
+async def get_deleted_files(db=Depends(get_db), current_user: dict = Depends(get_current_user)):
+    """Get the current user's deleted files (not yet permanently deleted)"""
     try:
         now = datetime.utcnow()
         
-        # Clean up permanently deleted files
-        await db.deleted_files.delete_many({"permanent_delete_at": {"$lt": now}})
-        
-        # Get remaining deleted files
-        files = await db.deleted_files.find().to_list(100)
+        # Get deleted files still within retention (expired ones are purged by the trash sweeper)
+        files = await db.deleted_files.find({
+            "owner_id": current_user["user_id"],
+            "permanent_delete_at": {"$gte": now}
+        }).to_list(100)
         
         for f in files:
             f["_id"] = str(f["_id"])
@@ -262,3 +290,26 @@ async def get_deleted_files(db=Depends(get_db)):
         return {"files": files}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+# ============ MAINTENANCE ============
+
+async def purge_expired_trash():
+    """Release GridFS blobs whose 30-day trash retention has passed"""
+    db = get_db()
+    fs = get_fs()
+    
+    while True:
+        expired = await db.deleted_files.find(
+            {"permanent_delete_at": {"$lt": datetime.utcnow()}}
+        ).limit(100).to_list(100)
+        
+        if not expired:
+            break
+        
+        for entry in expired:
+            # Drops this reference; the blob itself goes once no other upload shares it.
+            # Entries trashed before ownership was recorded are only dropped from the trash
+            if entry.get("owner_id") and await is_file_owner(db, entry["file_id"], entry["owner_id"]):
+                await release_file(db, fs, ObjectId(entry["file_id"]))
+            await db.deleted_files.delete_one({"_id": entry["_id"]})
@@ -1,14 +1,30 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from fastapi.responses import StreamingResponse
-from bson import ObjectId
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, HTTPException, Depends, Request
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Optional
 import mimetypes
+import uuid
 
+from config import settings
 from utils.auth import get_current_user
 from utils.db import get_db, get_fs
+from utils.http_range import parse_range_header, etag_matches, if_range_matches, not_modified_since, http_date, RangeNotSatisfiable
+from services.storage import stream_upload, dedupe_stored_file, release_file, UploadTooLarge
+from services.blob_cache import blob_cache
+from services.thumbnails import enqueue_thumbnails
+from services.file_info import get_file_infos, get_stored_file, blob_id_of, open_content
+from services.metrics import metrics
 
 router = APIRouter(prefix="/api/files", tags=["Files"])
 
+# File ids are never reused for different content, so downloads can be cached for good
+DOWNLOAD_CACHE_CONTROL = "private, max-age=31536000, immutable"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024  # 1MB
+
+
+class FileInfoBatchRequest(BaseModel):
+    file_ids: List[str] = Field(..., max_length=settings.MAX_FILE_INFO_BATCH)
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
@@ -18,90 +34,217 @@ async def upload_file(
     fs = get_fs()
     db = get_db()
     
-    # Read file content
-    content = await file.read()
-    file_size = len(content)
-    
     # Detect content type
     content_type = file.content_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
     
-    # Store in GridFS
-    file_id = await fs.upload_from_stream(
-        file.filename,
-        content,
-        metadata={
-            "content_type": content_type,
-            "uploaded_by": current_user["user_id"],
-            "original_filename": file.filename,
-            "size": file_size
-        }
-    )
+    # Stream into GridFS without buffering the whole file in memory
+    try:
+        stored = await stream_upload(
+            fs,
+            file,
+            file.filename,
+            metadata={
+                "content_type": content_type,
+                "uploaded_by": current_user["user_id"],
+                "original_filename": file.filename
+            }
+        )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    
+    # Reuse an existing blob when the same content was uploaded before
+    file_id = await dedupe_stored_file(db, fs, stored)
+    
+    # Generate downscaled previews in the background
+    await enqueue_thumbnails(file_id, content_type, stored["size"], owner_id=current_user["user_id"])
     
     return {
         "file_id": str(file_id),
         "filename": file.filename,
-        "size": file_size,
+        "size": stored["size"],
         "content_type": content_type
     }
 
+def file_etag(file_id: str, file_doc: dict) -> str:
+    """Strong ETag from the stored content hash, falling back to the immutable file id"""
+    metadata = file_doc.get("metadata") or {}
+    digest = metadata.get("sha256") or file_doc.get("md5") or file_id
+    return f'"{digest}"'
+
+
+async def read_range(grid_out, start: int, end: int):
+    """Yield bytes start..end (inclusive), seeking straight to the containing GridFS chunk"""
+    grid_out.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = await grid_out.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        metrics.inc("files.bytes_served_gridfs", len(chunk))
+        yield chunk
+
+
+async def read_cached_range(f, start: int, end: int):
+    """Yield bytes start..end (inclusive) from an open blob cache file"""
+    await f.seek(start)
+    remaining = end - start + 1
+    while remaining > 0:
+        chunk = await f.read(min(DOWNLOAD_CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        metrics.inc("blob_cache.bytes_served", len(chunk))
+        yield chunk
+
+
+async def closing(chunks, f):
+    """Yield from chunks, closing f once the response is done (or aborted)"""
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        if f is not None:
+            await f.close()
+
+
 @router.get("/{file_id}")
-async def download_file(file_id: str):
-    """Download/stream a file from GridFS"""
+async def download_file(file_id: str, request: Request):
+    """Download/stream a file from GridFS (supports Range and conditional requests)"""
     fs = get_fs()
     
+    # The upload's own document has its name and type; content may live in a shared blob
+    file_doc = await get_stored_file(get_db(), file_id)
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+    blob_id = blob_id_of(file_doc)
+    
     try:
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
+        grid_out = await open_content(fs, file_doc)
     except Exception:
         raise HTTPException(status_code=404, detail="File not found")
     
     # Get metadata
-    metadata = grid_out.metadata or {}
+    metadata = file_doc.get("metadata") or {}
     content_type = metadata.get("content_type", "application/octet-stream")
     filename = metadata.get("original_filename", "file")
+    size = grid_out.length
+    etag = file_etag(file_id, file_doc)
+    upload_date = file_doc.get("uploadDate") or grid_out.upload_date
     
-    async def generate():
-        while True:
-            chunk = await grid_out.read(1024 * 1024)  # 1MB chunks
-            if not chunk:
-                break
-            yield chunk
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Last-Modified": http_date(upload_date),
+        "Cache-Control": DOWNLOAD_CACHE_CONTROL,
+        "Content-Disposition": f'inline; filename="{filename}"'
+    }
+    
+    # Conditional GET - If-None-Match takes precedence over If-Modified-Since
+    if_none_match = request.headers.get("if-none-match")
+    if etag_matches(if_none_match, etag) or (
+        not if_none_match and not_modified_since(request.headers.get("if-modified-since"), upload_date)
+    ):
+        return Response(status_code=304, headers=headers)
+    
+    # Ignore Range if the client's cached copy (If-Range) is stale
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if if_range and not if_range_matches(if_range, etag, upload_date):
+        range_header = None
+    
+    try:
+        ranges = parse_range_header(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    
+    # Serve hot files from local disk; populate the cache in the background on a miss
+    # Cached by blob, so deduplicated uploads share one cached copy. The file is
+    # opened up front so eviction can't remove it while the response streams
+    cached_file = await blob_cache.open(str(blob_id)) if blob_cache.enabled else None
+    if cached_file:
+        reader = lambda start, end: read_cached_range(cached_file, start, end)
+    else:
+        blob_cache.schedule_fill(str(blob_id), size)
+        reader = lambda start, end: read_range(grid_out, start, end)
+    
+    if not ranges:
+        return StreamingResponse(
+            closing(reader(0, size - 1), cached_file),
+            media_type=content_type,
+            headers={**headers, "Content-Length": str(size)}
+        )
+    
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return StreamingResponse(
+            closing(reader(start, end), cached_file),
+            status_code=206,
+            media_type=content_type,
+            headers={
+                **headers,
+                "Content-Range": f"bytes {start}-{end}/{size}",
+                "Content-Length": str(end - start + 1)
+            }
+        )
+    
+    # Multiple ranges - multipart/byteranges, each part seeking to its own chunk
+    boundary = uuid.uuid4().hex
+    part_headers = [
+        (
+            f"\r\n--{boundary}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+        ).encode()
+        for start, end in ranges
+    ]
+    closing_boundary = f"\r\n--{boundary}--\r\n".encode()
+    content_length = sum(len(h) for h in part_headers) + sum(end - start + 1 for start, end in ranges) + len(closing_boundary)
+    
+    async def generate_parts():
+        for part_header, (start, end) in zip(part_headers, ranges):
+            yield part_header
+            async for chunk in reader(start, end):
+                yield chunk
+        yield closing_boundary
     
     return StreamingResponse(
-        generate(),
-        media_type=content_type,
-        headers={
-            "Content-Disposition": f'inline; filename="{filename}"'
-        }
+        closing(generate_parts(), cached_file),
+        status_code=206,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers={**headers, "Content-Length": str(content_length)}
     )
 
+@router.post("/info/batch")
+async def get_file_info_batch(request: FileInfoBatchRequest, current_user: dict = Depends(get_current_user)):
+    """Get metadata for many files in one call (e.g. a page of media messages)"""
+    infos = await get_file_infos(get_db(), request.file_ids)
+    return {"files": infos, "missing": [fid for fid in request.file_ids if fid not in infos]}
+
+
 @router.get("/{file_id}/info")
 async def get_file_info(file_id: str, current_user: dict = Depends(get_current_user)):
     """Get file metadata"""
-    fs = get_fs()
+    info = (await get_file_infos(get_db(), [file_id])).get(file_id)
     
-    try:
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
-    except Exception:
+    if not info:
         raise HTTPException(status_code=404, detail="File not found")
     
-    metadata = grid_out.metadata or {}
-    
-    return {
-        "file_id": file_id,
-        "filename": metadata.get("original_filename", "file"),
-        "size": metadata.get("size", 0),
-        "content_type": metadata.get("content_type", "application/octet-stream"),
-        "uploaded_by": metadata.get("uploaded_by")
-    }
+    return info
 
 @router.delete("/{file_id}")
 async def delete_file(file_id: str, current_user: dict = Depends(get_current_user)):
-    """Delete a file from GridFS"""
+    """Delete a file from GridFS (shared content is kept until its last reference goes)"""
     fs = get_fs()
+    db = get_db()
     
-    try:
-        await fs.delete(ObjectId(file_id))
-    except Exception:
+    file_doc = await get_stored_file(db, file_id)
+    if not file_doc:
+        raise HTTPException(status_code=404, detail="File not found")
+    if (file_doc.get("metadata") or {}).get("uploaded_by") != current_user["user_id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to delete this file")
+    
+    if not await release_file(db, fs, file_doc["_id"]):
         raise HTTPException(status_code=404, detail="File not found")
     
     return {"message": "File deleted successfully"}
@@ -0,0 +1,21 @@
+from fastapi import APIRouter, HTTPException, Depends
+
+from utils.auth import get_current_user
+from services.jobs import job_queue, serialize_job
+
+router = APIRouter(prefix="/api/jobs", tags=["Jobs"])
+
+
+@router.get("/{job_id}")
+async def get_job_status(job_id: str, current_user: dict = Depends(get_current_user)):
+    """Get progress of a background job"""
+    job = await job_queue.get_job(job_id)
+    
+    # Jobs without an owner are internal
+    if not job or not job.get("owner_id"):
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job["owner_id"] != current_user["user_id"]:
+        raise HTTPException(status_code=403, detail="Not authorized to view this job")
+    
+    return serialize_job(job)
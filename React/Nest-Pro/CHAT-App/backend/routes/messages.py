@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends, status
+from fastapi import APIRouter, HTTPException, Depends, Response, status
 from typing import List, Optional
 from bson import ObjectId
 from datetime import datetime
@@ -6,6 +6,11 @@ from datetime import datetime
 from models.message import MessageCreate, MessageResponse
 from utils.auth import get_current_user
 from utils.db import get_db
+from utils.pagination import parse_cursor, cursor_query, next_cursor, InvalidCursor
+from services.message_dedup import insert_message, normalize_client_id
+from services.reply_previews import resolve_reply_previews, reply_preview_for, get_reply_preview, invalidate_reply_preview
+from services.thumbnails import resolve_file_previews
+from services.media_index import index_message, remove_message, chat_key, serialize_entry, CATEGORIES
 
 router = APIRouter(prefix="/api/messages", tags=["Messages"])
 
@@ -31,6 +36,9 @@ async def get_conversation(
     
     messages = await db.messages.find(query).sort("timestamp", -1).limit(limit).to_list(length=limit)
     
+    reply_previews = await resolve_reply_previews(db, messages)
+    file_previews = await resolve_file_previews(db, (msg.get("file_id") for msg in messages))
+    
     # Get sender info
     result = []
     for msg in reversed(messages):
@@ -48,6 +56,8 @@ async def get_conversation(
             file_name=msg.get("file_name"),
             file_size=msg.get("file_size"),
             reply_to=msg.get("reply_to"),
+            reply_preview=reply_preview_for(reply_previews, msg),
+            **file_previews.get(msg.get("file_id"), {}),
             read_by=msg.get("read_by", []),
             delivered_to=msg.get("delivered_to", []),
             timestamp=msg["timestamp"],
@@ -74,6 +84,9 @@ async def get_room_messages(
     
     messages = await db.messages.find(query).sort("timestamp", -1).limit(limit).to_list(length=limit)
     
+    reply_previews = await resolve_reply_previews(db, messages)
+    file_previews = await resolve_file_previews(db, (msg.get("file_id") for msg in messages))
+    
     result = []
     for msg in reversed(messages):
         sender = await db.users.find_one({"_id": ObjectId(msg["sender_id"])})
@@ -89,6 +102,8 @@ async def get_room_messages(
             file_name=msg.get("file_name"),
             file_size=msg.get("file_size"),
             reply_to=msg.get("reply_to"),
+            reply_preview=reply_preview_for(reply_previews, msg),
+            **file_previews.get(msg.get("file_id"), {}),
             read_by=msg.get("read_by", []),
             delivered_to=msg.get("delivered_to", []),
             timestamp=msg["timestamp"],
@@ -99,6 +114,54 @@ async def get_room_messages(
     return result
 
 
+async def get_chat_media(key: str, category: str, limit: int, before: Optional[str]) -> dict:
+    """Page through the per-chat media/links/docs index"""
+    if category not in CATEGORIES:
+        raise HTTPException(status_code=400, detail=f"Category must be one of: {', '.join(CATEGORIES)}")
+    
+    db = get_db()
+    limit = max(1, min(limit, 100))
+    query = {"chat_key": key, "category": category}
+    
+    try:
+        cursor = parse_cursor(before)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if cursor:
+        query.update(cursor_query("timestamp", cursor))
+    
+    entries = await db.chat_media.find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit).to_list(length=limit)
+    
+    return {
+        "items": [serialize_entry(entry) for entry in entries],
+        "next_before": next_cursor(entries, "timestamp", limit)
+    }
+
+
+@router.get("/media/conversation/{user_id}")
+async def get_conversation_media(
+    user_id: str,
+    category: str = "media",
+    limit: int = 50,
+    before: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get media, links or docs shared with another user"""
+    return await get_chat_media(chat_key(current_user["user_id"], user_id), category, limit, before)
+
+
+@router.get("/media/room/{room_id}")
+async def get_room_media(
+    room_id: str,
+    category: str = "media",
+    limit: int = 50,
+    before: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get media, links or docs shared in a room/group"""
+    return await get_chat_media(chat_key(current_user["user_id"], room_id=room_id), category, limit, before)
+
+
 @router.get("/starred", response_model=List[MessageResponse])
 async def get_starred_messages(current_user: dict = Depends(get_current_user)):
     """Get all starred messages for the current user"""
@@ -110,6 +173,9 @@ async def get_starred_messages(current_user: dict = Depends(get_current_user)):
         "deleted": {"$ne": True}
     }).sort("timestamp", -1).to_list(length=100)
     
+    reply_previews = await resolve_reply_previews(db, messages)
+    file_previews = await resolve_file_previews(db, (msg.get("file_id") for msg in messages))
+    
     result = []
     for msg in messages:
         sender = await db.users.find_one({"_id": ObjectId(msg["sender_id"])})
@@ -126,6 +192,8 @@ async def get_starred_messages(current_user: dict = Depends(get_current_user)):
             file_name=msg.get("file_name"),
             file_size=msg.get("file_size"),
             reply_to=msg.get("reply_to"),
+            reply_preview=reply_preview_for(reply_previews, msg),
+            **file_previews.get(msg.get("file_id"), {}),
             read_by=msg.get("read_by", []),
             delivered_to=msg.get("delivered_to", []),
             starred_by=msg.get("starred_by", []),
@@ -140,6 +208,7 @@ async def get_starred_messages(current_user: dict = Depends(get_current_user)):
 @router.post("/", response_model=MessageResponse, status_code=status.HTTP_201_CREATED)
 async def send_message(
     message_data: MessageCreate,
+    response: Response,
     current_user: dict = Depends(get_current_user)
 ):
     """Send a message (REST fallback)"""
@@ -155,6 +224,7 @@ async def send_message(
         "file_name": message_data.file_name,
         "file_size": message_data.file_size,
         "reply_to": message_data.reply_to,
+        "client_id": normalize_client_id(message_data.client_id),
         "read_by": [],
         "delivered_to": [],
         "timestamp": datetime.utcnow(),
@@ -162,28 +232,37 @@ async def send_message(
         "deleted": False
     }
     
-    result = await db.messages.insert_one(message_dict)
+    message_dict, created = await insert_message(db, message_dict)
+    
+    if created:
+        await index_message(db, message_dict)
+    else:
+        # Retried send - return the original message
+        response.status_code = status.HTTP_200_OK
     
     sender = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
     
     return MessageResponse(
-        id=str(result.inserted_id),
+        id=str(message_dict["_id"]),
         sender_id=current_user["user_id"],
         sender_username=sender["username"],
         sender_avatar=sender.get("avatar"),
-        receiver_id=message_data.receiver_id,
-        room_id=message_data.room_id,
-        content=message_data.content,
-        message_type=message_data.message_type,
-        file_id=message_data.file_id,
-        file_name=message_data.file_name,
-        file_size=message_data.file_size,
-        reply_to=message_data.reply_to,
-        read_by=[],
-        delivered_to=[],
+        receiver_id=message_dict.get("receiver_id"),
+        room_id=message_dict.get("room_id"),
+        content=message_dict["content"],
+        message_type=message_dict.get("message_type", "text"),
+        file_id=message_dict.get("file_id"),
+        file_name=message_dict.get("file_name"),
+        file_size=message_dict.get("file_size"),
+        reply_to=message_dict.get("reply_to"),
+        reply_preview=await get_reply_preview(db, message_dict),
+        **(await resolve_file_previews(db, [message_dict.get("file_id")])).get(message_dict.get("file_id"), {}),
+        client_id=message_dict.get("client_id"),
+        read_by=message_dict.get("read_by", []),
+        delivered_to=message_dict.get("delivered_to", []),
         timestamp=message_dict["timestamp"],
-        edited=False,
-        deleted=False
+        edited=message_dict.get("edited", False),
+        deleted=message_dict.get("deleted", False)
     )
 
 @router.put("/{message_id}/read")
@@ -215,6 +294,8 @@ async def delete_message(message_id: str, current_user: dict = Depends(get_curre
         {"_id": ObjectId(message_id)},
         {"$set": {"deleted": True, "content": "This message was deleted"}}
     )
+    invalidate_reply_preview(message_id)
+    await remove_message(db, message_id)
     
     return {"message": "Message deleted"}
 
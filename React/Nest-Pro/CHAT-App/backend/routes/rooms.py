@@ -6,6 +6,7 @@ from datetime import datetime
 from models.room import RoomCreate, RoomUpdate, RoomResponse
 from utils.auth import get_current_user
 from utils.db import get_db
+from services.jobs import job_queue
 
 router = APIRouter(prefix="/api/rooms", tags=["Rooms/Groups"])
 
@@ -199,7 +200,12 @@ async def delete_room(room_id: str, current_user: dict = Depends(get_current_use
     
     await db.rooms.delete_one({"_id": ObjectId(room_id)})
     
-    # Also delete all messages in room
-    await db.messages.delete_many({"room_id": room_id})
+    # Delete all messages in room in the background
+    job = await job_queue.enqueue(
+        "delete_room_messages",
+        {"room_id": room_id},
+        owner_id=current_user["user_id"],
+        notify_room=room_id
+    )
     
-    return {"message": "Room deleted successfully"}
+    return {"message": "Room deleted successfully", "job_id": str(job["_id"])}
@@ -5,6 +5,8 @@ from passlib.context import CryptContext
 from models.user import UserSettings, SettingsUpdate, PasswordChange, UserPublic
 from utils.auth import get_current_user
 from utils.db import get_db
+from services.status_feed import remove_feed_entry
+from services.ai_cache import set_cache_preference
 
 router = APIRouter(prefix="/api/settings", tags=["Settings"])
 
@@ -63,6 +65,9 @@ async def update_settings(
         {"$set": {"settings": current_settings}}
     )
     
+    if "arise_response_cache" in update_dict:
+        set_cache_preference(current_user["user_id"], update_dict["arise_response_cache"])
+    
     return UserSettings(**current_settings)
 
 @router.put("/password")
@@ -147,6 +152,7 @@ async def block_user(user_id: str, current_user: dict = Depends(get_current_user
         {"_id": ObjectId(current_user["user_id"])},
         {"$pull": {"contacts": user_id}}
     )
+    await remove_feed_entry(db, current_user["user_id"], user_id)
     
     return {"message": "User blocked successfully"}
 
@@ -6,13 +6,19 @@ from pydantic import BaseModel
 import os
 
 from utils.auth import get_current_user
-from utils.db import get_db
+from utils.db import get_db, get_fs
+from utils.pagination import parse_cursor, InvalidCursor
+from services.status_feed import (
+    STATUS_EXPIRY_HOURS, get_status_feed, fan_out_status, status_readers,
+    status_cutoff, remove_status_from_feeds, mark_feed_viewed
+)
+from services.status_views import viewed_status_ids, record_views, get_viewers, delete_views
+from services.storage import release_file
+from services.file_info import get_stored_file
+from services.websocket import manager
 
 router = APIRouter(prefix="/api/status", tags=["Status"])
 
-# Status expires after 24 hours
-STATUS_EXPIRY_HOURS = 24
-
 
 class StatusCreate(BaseModel):
     content: Optional[str] = None
@@ -58,7 +64,7 @@ async def get_my_statuses(current_user: dict = Depends(get_current_user)):
             "media_type": status.get("media_type"),
             "background_color": status.get("background_color", "#6366f1"),
             "created_at": status["created_at"].isoformat(),
-            "views": len(status.get("viewed_by", []))
+            "views": status.get("view_count", 0)
         })
     
     return result
@@ -68,78 +74,9 @@ async def get_my_statuses(current_user: dict = Depends(get_current_user)):
 async def get_contacts_statuses(current_user: dict = Depends(get_current_user)):
     """Get statuses from user's contacts"""
     db = get_db()
-    user_id = current_user["user_id"]
-    
-    # Get user's contacts
-    user = await db.users.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    contacts = user.get("contacts", [])
-    
-    # Get statuses from contacts in last 24 hours
-    cutoff_time = datetime.utcnow() - timedelta(hours=STATUS_EXPIRY_HOURS)
-    
-    # Group statuses by user
-    pipeline = [
-        {
-            "$match": {
-                "user_id": {"$in": contacts},
-                "created_at": {"$gte": cutoff_time}
-            }
-        },
-        {
-            "$sort": {"created_at": -1}
-        },
-        {
-            "$group": {
-                "_id": "$user_id",
-                "statuses": {"$push": "$$ROOT"},
-                "latest": {"$first": "$created_at"}
-            }
-        },
-        {
-            "$sort": {"latest": -1}
-        }
-    ]
-    
-    grouped = await db.statuses.aggregate(pipeline).to_list(100)
-    
-    # Get user info for each contact
-    result = {
-        "recent": [],
-        "viewed": []
-    }
     
-    for group in grouped:
-        contact_id = group["_id"]
-        contact = await db.users.find_one({"_id": ObjectId(contact_id)})
-        if not contact:
-            continue
-        
-        statuses = group["statuses"]
-        
-        # Check if all statuses are viewed
-        all_viewed = all(
-            user_id in s.get("viewed_by", []) 
-            for s in statuses
-        )
-        
-        contact_data = {
-            "user_id": contact_id,
-            "username": contact.get("username", "Unknown"),
-            "avatar": contact.get("avatar"),
-            "status_count": len(statuses),
-            "latest_time": group["latest"].isoformat(),
-            "all_viewed": all_viewed
-        }
-        
-        if all_viewed:
-            result["viewed"].append(contact_data)
-        else:
-            result["recent"].append(contact_data)
-    
-    return result
+    # Feed entries are maintained on write, so this is a single read
+    return await get_status_feed(db, current_user["user_id"])
 
 
 @router.get("/user/{user_id}")
@@ -161,19 +98,14 @@ async def get_user_statuses(user_id: str, current_user: dict = Depends(get_curre
     username = user.get("username", "Unknown") if user else "Unknown"
     avatar = user.get("avatar") if user else None
     
+    status_ids = [str(status["_id"]) for status in statuses]
+    viewed = await viewed_status_ids(db, current_user_id, status_ids)
+    
     result = []
     for status in statuses:
-        viewed_by = status.get("viewed_by", [])
-        
-        # Mark as viewed if not own status
-        if current_user_id != user_id and current_user_id not in viewed_by:
-            await db.statuses.update_one(
-                {"_id": status["_id"]},
-                {"$addToSet": {"viewed_by": current_user_id}}
-            )
-        
+        status_id = str(status["_id"])
         result.append({
-            "id": str(status["_id"]),
+            "id": status_id,
             "user_id": user_id,
             "username": username,
             "avatar": avatar,
@@ -182,10 +114,18 @@ async def get_user_statuses(user_id: str, current_user: dict = Depends(get_curre
             "media_type": status.get("media_type"),
             "background_color": status.get("background_color", "#6366f1"),
             "created_at": status["created_at"].isoformat(),
-            "views": len(viewed_by),
-            "viewed_by_me": current_user_id in viewed_by
+            "views": status.get("view_count", 0),
+            "viewed_by_me": status_id in viewed
         })
     
+    # Mark as viewed if not own status, in one batch
+    newly_viewed = []
+    if current_user_id != user_id:
+        unviewed = [status_id for status_id in status_ids if status_id not in viewed]
+        newly_viewed = await record_views(db, user_id, current_user_id, unviewed)
+    
+    await mark_feed_viewed(db, current_user_id, user_id, newly_viewed)
+    
     return result
 
 
@@ -198,6 +138,12 @@ async def create_status(status_data: StatusCreate, current_user: dict = Depends(
     if not status_data.content and not status_data.media_id:
         raise HTTPException(status_code=400, detail="Status must have content or media")
     
+    if status_data.media_id:
+        # The media is released when the status expires, so it must be the author's own upload
+        media = await get_stored_file(db, status_data.media_id)
+        if not media or (media.get("metadata") or {}).get("uploaded_by") != user_id:
+            raise HTTPException(status_code=403, detail="Status media must be your own upload")
+    
     status = {
         "user_id": user_id,
         "content": status_data.content,
@@ -205,10 +151,27 @@ async def create_status(status_data: StatusCreate, current_user: dict = Depends(
         "media_type": status_data.media_type,
         "background_color": status_data.background_color or "#6366f1",
         "created_at": datetime.utcnow(),
-        "viewed_by": []
+        "view_count": 0
     }
     
     result = await db.statuses.insert_one(status)
+    status["_id"] = result.inserted_id
+    
+    author = await db.users.find_one({"_id": ObjectId(user_id)}, {"username": 1, "avatar": 1})
+    if author:
+        reader_ids = await fan_out_status(db, author, status)
+        
+        # Push to contacts so their Status tab updates without polling
+        event = {
+            "type": "status_created",
+            "user_id": user_id,
+            "status_id": str(status["_id"]),
+            "username": author.get("username", "Unknown"),
+            "avatar": author.get("avatar"),
+            "created_at": status["created_at"].isoformat()
+        }
+        for reader_id in reader_ids:
+            await manager.send_personal(reader_id, event)
     
     return {
         "id": str(result.inserted_id),
@@ -222,42 +185,89 @@ async def delete_status(status_id: str, current_user: dict = Depends(get_current
     db = get_db()
     user_id = current_user["user_id"]
     
-    result = await db.statuses.delete_one({
+    status = await db.statuses.find_one_and_delete({
         "_id": ObjectId(status_id),
         "user_id": user_id
     })
     
-    if result.deleted_count == 0:
+    if not status:
         raise HTTPException(status_code=404, detail="Status not found")
     
+    await remove_statuses(db, [status], reason="deleted")
+    
     return {"message": "Status deleted"}
 
 
 @router.get("/{status_id}/views")
-async def get_status_views(status_id: str, current_user: dict = Depends(get_current_user)):
-    """Get list of users who viewed a status"""
+async def get_status_views(
+    status_id: str,
+    limit: int = 50,
+    before: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """Get a page of users who viewed a status"""
     db = get_db()
     user_id = current_user["user_id"]
     
     status = await db.statuses.find_one({
         "_id": ObjectId(status_id),
         "user_id": user_id
-    })
+    }, {"view_count": 1})
     
     if not status:
         raise HTTPException(status_code=404, detail="Status not found")
     
-    viewed_by = status.get("viewed_by", [])
+    try:
+        cursor = parse_cursor(before)
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    page = await get_viewers(db, status_id, limit, cursor)
+    page["total"] = status.get("view_count", 0)
+    
+    return page
+
+
+# ============ EXPIRY ============
+
+async def remove_statuses(db, statuses: List[dict], reason: str):
+    """Clean up after statuses already removed from the collection and notify contacts"""
+    fs = get_fs()
+    by_author = {}
+    
+    for status in statuses:
+        status_id = str(status["_id"])
+        by_author.setdefault(status["user_id"], []).append(status_id)
+        await remove_status_from_feeds(db, status["user_id"], status_id)
+        
+        media_id = status.get("media_id")
+        if media_id and ObjectId.is_valid(media_id):
+            await release_file(db, fs, ObjectId(media_id))
+    
+    await delete_views(db, [str(status["_id"]) for status in statuses])
     
-    # Get user info for viewers
-    viewers = []
-    for viewer_id in viewed_by:
-        viewer = await db.users.find_one({"_id": ObjectId(viewer_id)})
-        if viewer:
-            viewers.append({
-                "user_id": viewer_id,
-                "username": viewer.get("username", "Unknown"),
-                "avatar": viewer.get("avatar")
-            })
+    for author_id, status_ids in by_author.items():
+        event = {
+            "type": "status_expired",
+            "user_id": author_id,
+            "status_ids": status_ids,
+            "reason": reason
+        }
+        for reader_id in await status_readers(db, author_id) + [author_id]:
+            await manager.send_personal(reader_id, event)
+
+
+async def purge_expired_statuses():
+    """Delete statuses past 24 hours, releasing their media before the TTL index would"""
+    db = get_db()
     
-    return viewers
+    while True:
+        expired = await db.statuses.find(
+            {"created_at": {"$lt": status_cutoff()}}
+        ).limit(100).to_list(100)
+        
+        if not expired:
+            break
+        
+        await db.statuses.delete_many({"_id": {"$in": [status["_id"] for status in expired]}})
+        await remove_statuses(db, expired, reason="expired")
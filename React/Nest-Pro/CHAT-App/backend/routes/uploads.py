@@ -0,0 +1,114 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from pydantic import BaseModel, Field
+from typing import Optional
+import mimetypes
+
+from config import settings
+from utils.auth import get_current_user
+from utils.db import get_db, get_fs
+from services.storage import dedupe_stored_file
+from services.thumbnails import enqueue_thumbnails
+from services.upload_sessions import (
+    create_session, get_session, write_chunks, received_chunks, committed_offset,
+    finalize_session, abort_session, UploadSessionError, SESSION_OPEN
+)
+
+router = APIRouter(prefix="/api/uploads", tags=["Resumable Uploads"])
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., ge=0)
+    content_type: Optional[str] = None
+
+
+def session_status(session: dict, chunks: list) -> dict:
+    return {
+        "upload_id": str(session["_id"]),
+        "filename": session["filename"],
+        "size": session["size"],
+        "chunk_size": session["chunk_size"],
+        "total_chunks": session["total_chunks"],
+        "received_chunks": len(chunks),
+        "committed_offset": committed_offset(session, chunks),
+        "missing_chunks": sorted(set(range(session["total_chunks"])) - set(chunks)),
+        "expires_at": session["expires_at"].isoformat()
+    }
+
+
+@router.post("")
+async def create_upload_session(data: UploadSessionCreate, current_user: dict = Depends(get_current_user)):
+    """Start a resumable upload"""
+    if data.size > settings.MAX_FILE_SIZE:
+        raise HTTPException(status_code=413, detail=f"File exceeds maximum size of {settings.MAX_FILE_SIZE} bytes")
+    
+    content_type = data.content_type or mimetypes.guess_type(data.filename)[0] or "application/octet-stream"
+    session = await create_session(current_user["user_id"], data.filename, data.size, content_type)
+    
+    return session_status(session, [])
+
+
+@router.get("/{upload_id}")
+async def get_upload_status(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Query committed offset and missing chunks (e.g. after reconnecting)"""
+    session = await get_session(upload_id, current_user["user_id"])
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    
+    return session_status(session, await received_chunks(session))
+
+
+@router.put("/{upload_id}")
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0),
+    current_user: dict = Depends(get_current_user)
+):
+    """Upload raw bytes at a chunk-aligned offset (chunks may be sent in parallel)"""
+    session = await get_session(upload_id, current_user["user_id"])
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    
+    try:
+        written = await write_chunks(session, offset, request.stream())
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {"upload_id": upload_id, "offset": offset, "written": written}
+
+
+@router.post("/{upload_id}/complete")
+async def complete_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Finalize an upload once every chunk is stored"""
+    session = await get_session(upload_id, current_user["user_id"])
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    
+    try:
+        stored = await finalize_session(session)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    file_id = await dedupe_stored_file(get_db(), get_fs(), stored)
+    await enqueue_thumbnails(file_id, session["content_type"], stored["size"], owner_id=current_user["user_id"])
+    
+    return {
+        "file_id": str(file_id),
+        "filename": session["filename"],
+        "size": stored["size"],
+        "content_type": session["content_type"]
+    }
+
+
+@router.delete("/{upload_id}")
+async def cancel_upload(upload_id: str, current_user: dict = Depends(get_current_user)):
+    """Abort an upload and discard stored chunks"""
+    session = await get_session(upload_id, current_user["user_id"])
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session["status"] != SESSION_OPEN:
+        raise HTTPException(status_code=409, detail="Upload is being finalized")
+    
+    await abort_session(session)
+    return {"message": "Upload cancelled"}
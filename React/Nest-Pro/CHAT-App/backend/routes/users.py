@@ -6,6 +6,7 @@ from datetime import datetime
 from models.user import UserResponse, UserUpdate, UserPublic, UserSettings
 from utils.auth import get_current_user
 from utils.db import get_db
+from services.status_feed import sync_feed_entry, remove_feed_entry, refresh_contact_profile
 
 router = APIRouter(prefix="/api/users", tags=["Users"])
 
@@ -171,6 +172,10 @@ async def add_contact(contact_id: str, current_user: dict = Depends(get_current_
         {"$addToSet": {"contacts": current_user["user_id"]}}
     )
     
+    # Both users now see each other's live statuses
+    await sync_feed_entry(db, current_user["user_id"], contact_id)
+    await sync_feed_entry(db, contact_id, current_user["user_id"])
+    
     return {"message": "Contact added successfully"}
 
 @router.delete("/contacts/{contact_id}")
@@ -182,6 +187,7 @@ async def remove_contact(contact_id: str, current_user: dict = Depends(get_curre
         {"_id": ObjectId(current_user["user_id"])},
         {"$pull": {"contacts": contact_id}}
     )
+    await remove_feed_entry(db, current_user["user_id"], contact_id)
     
     return {"message": "Contact removed successfully"}
 
@@ -221,6 +227,10 @@ async def update_profile(
     
     user = await db.users.find_one({"_id": ObjectId(current_user["user_id"])})
     
+    # Status feeds carry a copy of the author's name and avatar
+    if "username" in update_dict or "avatar" in update_dict:
+        await refresh_contact_profile(db, user)
+    
     return UserResponse(
         id=str(user["_id"]),
         username=user["username"],
@@ -0,0 +1,72 @@
+from typing import List, Optional
+from bson import ObjectId
+import hashlib
+import json
+import re
+
+from config import settings
+from utils.cache import TTLCache
+from utils.db import get_db
+from services.metrics import metrics
+
+# Normalized request hash -> reply text, shared between users so repeated
+# suggestion chips and common collaboration topics skip the provider
+response_cache = TTLCache(
+    max_size=settings.AI_CACHE_SIZE,
+    ttl=settings.AI_CACHE_TTL_SECONDS
+)
+
+# user_id -> whether the user allows cached replies (users.settings.arise_response_cache)
+cache_preferences = TTLCache(max_size=10000, ttl=300)
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(text: Optional[str]) -> str:
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def response_key(model: str, system: str, history: List[dict], prompt: str) -> str:
+    """Hash of everything the provider sees; only runs of whitespace are collapsed, case matters"""
+    payload = json.dumps([
+        model,
+        _normalize(system),
+        [[msg.get("role", "user"), _normalize(msg.get("content"))] for msg in history],
+        _normalize(prompt)
+    ])
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def cache_enabled_for(user_id: str) -> bool:
+    """Users can opt out of both reading and contributing cached replies"""
+    if not settings.AI_CACHE_SIZE:
+        return False
+
+    enabled = cache_preferences.get(user_id)
+    if enabled is None:
+        user = await get_db().users.find_one(
+            {"_id": ObjectId(user_id)},
+            {"settings.arise_response_cache": 1}
+        )
+        enabled = ((user or {}).get("settings") or {}).get("arise_response_cache", True)
+        cache_preferences.set(user_id, enabled)
+    return enabled
+
+
+def set_cache_preference(user_id: str, enabled: bool):
+    cache_preferences.set(user_id, enabled)
+
+
+def get_cached_reply(key: str) -> Optional[str]:
+    reply = response_cache.get(key)
+    metrics.inc("ai_cache.hits" if reply is not None else "ai_cache.misses")
+    return reply
+
+
+def store_reply(key: str, reply: str):
+    if reply:
+        response_cache.set(key, reply)
+
+
+metrics.gauge("ai_cache.entries", lambda: len(response_cache))
+metrics.gauge("ai_cache.hit_ratio", lambda: metrics.ratio("ai_cache.hits", "ai_cache.misses"))
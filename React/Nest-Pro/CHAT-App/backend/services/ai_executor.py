@@ -0,0 +1,179 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional
+import asyncio
+import functools
+import threading
+import time
+
+from config import settings
+from services.metrics import metrics
+
+
+class AIBusy(Exception):
+    """Too many AI requests in flight, for the user or overall"""
+
+
+class AITimeout(Exception):
+    """The provider did not answer within AI_TIMEOUT_SECONDS"""
+
+
+class AIExecutor:
+    """
+    Runs blocking LLM SDK calls on a dedicated thread pool so they never block
+    the event loop, with per-user and global concurrency limits.
+    """
+
+    def __init__(self, workers: int, per_user: int, max_queue: int, timeout: float):
+        self.workers = workers
+        self.per_user = per_user
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        # user_id -> requests admitted (queued or running)
+        self.user_active: Dict[str, int] = {}
+        self.queued = 0
+        self.running = 0
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="arise")
+            self._slots = asyncio.Semaphore(self.workers)
+        return self._pool
+
+    @asynccontextmanager
+    async def _admitted(self, user_id: str):
+        """
+        Admit a request under the per-user and queue limits and wait for a
+        worker slot. The caller must hand the admission to _submit, which then
+        owns both the slot and the user's count.
+        """
+        if self.user_active.get(user_id, 0) >= self.per_user:
+            metrics.inc("ai.rejected_user")
+            raise AIBusy("You already have Arise requests in progress, please wait")
+        if self.queued >= self.max_queue:
+            metrics.inc("ai.rejected_global")
+            raise AIBusy("Arise is busy right now, please try again shortly")
+
+        self._get_pool()
+        self.user_active[user_id] = self.user_active.get(user_id, 0) + 1
+        admission = {"user_id": user_id, "submitted": False}
+        self.queued += 1
+        queued_at = time.monotonic()
+        try:
+            try:
+                await self._slots.acquire()
+            finally:
+                self.queued -= 1
+            metrics.observe("ai.queue_wait_ms", (time.monotonic() - queued_at) * 1000)
+            yield admission
+        finally:
+            if not admission["submitted"]:
+                self._release_user(user_id)
+
+    def _submit(self, admission: dict, func: Callable[[], Any]) -> asyncio.Future:
+        admission["submitted"] = True
+        self.running += 1
+        future = asyncio.get_running_loop().run_in_executor(self._get_pool(), func)
+        # A thread can't be interrupted, so the slot and the user's count are
+        # only freed once it really finishes, not when the caller gives up
+        future.add_done_callback(functools.partial(self._release, admission["user_id"]))
+        return future
+
+    async def run(self, user_id: str, func: Callable[..., Any], *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """Run func(*args, **kwargs) on the pool, raising AIBusy or AITimeout"""
+        async with self._admitted(user_id) as admission:
+            started = time.monotonic()
+            future = self._submit(admission, functools.partial(func, *args, **kwargs))
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), timeout or self.timeout)
+            except asyncio.TimeoutError:
+                metrics.inc("ai.timeouts")
+                raise AITimeout("Arise took too long to respond")
+            finally:
+                metrics.observe("ai.call_ms", (time.monotonic() - started) * 1000)
+
+    async def stream(self, user_id: str, func: Callable[[], Iterable[str]],
+                     timeout: Optional[float] = None) -> AsyncIterator[str]:
+        """
+        Iterate a blocking chunk iterator (created by func) on the pool and yield
+        chunks as they arrive. Closing the generator stops the worker at the next
+        chunk, which drops the upstream stream. timeout applies between chunks.
+        """
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        finished = object()
+
+        def put(item):
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:  # loop already closed
+                pass
+
+        def produce():
+            try:
+                for chunk in func():
+                    if cancelled.is_set():
+                        metrics.inc("ai.streams_cancelled")
+                        break
+                    put(chunk)
+            except Exception as e:
+                put(e)
+            finally:
+                put(finished)
+
+        async with self._admitted(user_id) as admission:
+            started = time.monotonic()
+            first_chunk = True
+            self._submit(admission, produce)
+            try:
+                while True:
+                    try:
+                        item = await asyncio.wait_for(chunks.get(), timeout or self.timeout)
+                    except asyncio.TimeoutError:
+                        metrics.inc("ai.timeouts")
+                        raise AITimeout("Arise took too long to respond")
+
+                    if item is finished:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    if first_chunk:
+                        metrics.observe("ai.time_to_first_chunk_ms", (time.monotonic() - started) * 1000)
+                        first_chunk = False
+                    yield item
+            finally:
+                cancelled.set()
+                metrics.observe("ai.call_ms", (time.monotonic() - started) * 1000)
+
+    def _release_user(self, user_id: str):
+        self.user_active[user_id] -= 1
+        if not self.user_active[user_id]:
+            del self.user_active[user_id]
+
+    def _release(self, user_id: str, future: asyncio.Future):
+        self.running -= 1
+        self._slots.release()
+        self._release_user(user_id)
+        if not future.cancelled() and future.exception() is not None:
+            metrics.inc("ai.errors")
+
+    def shutdown(self):
+        """Stop the worker threads"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# Global AI executor instance
+ai_executor = AIExecutor(
+    workers=settings.AI_WORKERS,
+    per_user=settings.AI_MAX_CONCURRENT_PER_USER,
+    max_queue=settings.AI_MAX_QUEUE,
+    timeout=settings.AI_TIMEOUT_SECONDS
+)
+
+metrics.gauge("ai.queue_depth", lambda: ai_executor.queued)
+metrics.gauge("ai.running", lambda: ai_executor.running)
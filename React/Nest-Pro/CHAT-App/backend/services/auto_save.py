@@ -0,0 +1,100 @@
+from pathlib import Path
+from typing import List, Optional, Set
+from bson import ObjectId
+import asyncio
+import os
+import aiofiles
+
+from config import settings
+from utils.db import get_db, get_fs
+from services.file_info import open_content
+
+# Sub-folder per file type under AUTO_SAVE_DIR
+AUTO_SAVE_FOLDERS = {"image": "Images", "video": "Videos", "file": "Files"}
+
+_export_slots: Optional[asyncio.Semaphore] = None
+# Target paths currently being written, and the tasks writing them
+_in_progress: Set[Path] = set()
+_tasks: Set[asyncio.Task] = set()
+
+
+def auto_save_base() -> Path:
+    return Path(settings.AUTO_SAVE_DIR)
+
+
+def target_folder(file_type: str) -> Path:
+    return auto_save_base() / AUTO_SAVE_FOLDERS.get(file_type, "Files")
+
+
+async def init_folders() -> List[str]:
+    """Create the auto-save folder structure"""
+    for folder in set(AUTO_SAVE_FOLDERS.values()):
+        await asyncio.to_thread((auto_save_base() / folder).mkdir, parents=True, exist_ok=True)
+    return sorted(set(AUTO_SAVE_FOLDERS.values()))
+
+
+async def find_file(file_id: str) -> Optional[dict]:
+    """Look up a GridFS file by id, or by filename for legacy references"""
+    files = get_db()["fs.files"]
+    # Shared content blobs are only reachable through their uploads
+    not_blob = {"metadata.blob": {"$ne": True}}
+    if ObjectId.is_valid(file_id):
+        return await files.find_one({"_id": ObjectId(file_id), **not_blob})
+    return await files.find_one({"filename": file_id, **not_blob})
+
+
+async def queue_export(file_id: str, file_type: str = "file") -> dict:
+    """Resolve the target path and export the file in the background"""
+    file_doc = await find_file(file_id)
+    if not file_doc:
+        return {"success": False, "error": "File not found"}
+
+    folder = target_folder(file_type)
+    filename = Path(file_doc.get("filename") or "").name or f"file_{file_id}"
+    target_path = folder / filename
+
+    if target_path in _in_progress:
+        return {"success": True, "message": "File save in progress", "path": str(target_path)}
+    if await asyncio.to_thread(target_path.exists):
+        return {"success": True, "message": "File already exists", "path": str(target_path)}
+
+    _in_progress.add(target_path)
+    task = asyncio.create_task(_export(file_doc, target_path))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+    return {"success": True, "message": "File save queued", "path": str(target_path)}
+
+
+async def queue_batch_export(files: List[dict]) -> List[dict]:
+    """Queue exports for many files"""
+    results = []
+    for item in files:
+        result = await queue_export(item["file_id"], item.get("file_type", "file"))
+        results.append({"file_id": item["file_id"], **result})
+    return results
+
+
+async def _export(file_doc: dict, target_path: Path):
+    """Stream a GridFS file to disk, at most AUTO_SAVE_CONCURRENCY at a time"""
+    global _export_slots
+    if _export_slots is None:
+        _export_slots = asyncio.Semaphore(settings.AUTO_SAVE_CONCURRENCY)
+
+    tmp_path = target_path.with_name(target_path.name + ".part")
+    try:
+        async with _export_slots:
+            await asyncio.to_thread(target_path.parent.mkdir, parents=True, exist_ok=True)
+            grid_out = await open_content(get_fs(), file_doc)
+            async with aiofiles.open(tmp_path, "wb") as f:
+                while True:
+                    chunk = await grid_out.readchunk()
+                    if not chunk:
+                        break
+                    await f.write(chunk)
+            await asyncio.to_thread(os.replace, tmp_path, target_path)
+    except Exception as e:
+        await asyncio.to_thread(tmp_path.unlink, missing_ok=True)
+        print(f"⚠️ Auto-save of {file_doc['_id']} to {target_path} failed: {e}")
+    finally:
+        _in_progress.discard(target_path)
@@ -0,0 +1,137 @@
+from collections import OrderedDict
+from pathlib import Path
+from typing import Set
+from bson import ObjectId
+import asyncio
+import os
+import aiofiles
+
+from config import settings
+from utils.db import get_fs
+from services.metrics import metrics
+
+
+class BlobCache:
+    """On-disk LRU cache of hot GridFS files with a total size budget"""
+
+    def __init__(self, directory: str, max_bytes: int, max_file_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.max_file_bytes = max_file_bytes
+        # file_id -> size in bytes, least recently used first
+        self.entries: "OrderedDict[str, int]" = OrderedDict()
+        self.total_bytes = 0
+        # file_ids currently being copied from GridFS
+        self.filling: Set[str] = set()
+        # Fills whose blob was invalidated meanwhile; their copy must not be added
+        self.stale_fills: Set[str] = set()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def load(self):
+        """Index files left on disk by a previous run, oldest first"""
+        if not self.enabled:
+            return
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        files = [p for p in self.directory.iterdir() if p.is_file() and ObjectId.is_valid(p.name)]
+        for path in sorted(files, key=lambda p: p.stat().st_mtime):
+            self._add(path.name, path.stat().st_size)
+        # Leftovers from interrupted fills
+        for path in self.directory.glob("*.part"):
+            path.unlink(missing_ok=True)
+
+        self._evict()
+
+    def path_for(self, file_id: str) -> Path:
+        return self.directory / file_id
+
+    async def open(self, file_id: str):
+        """
+        Open a cached file for reading, recording a hit or miss. The open handle
+        stays readable even if the entry is evicted or invalidated meanwhile.
+        """
+        if file_id in self.entries:
+            try:
+                handle = await aiofiles.open(self.path_for(file_id), "rb")
+            except FileNotFoundError:
+                self.invalidate(file_id)
+            else:
+                self.entries.move_to_end(file_id)
+                metrics.inc("blob_cache.hits")
+                return handle
+
+        metrics.inc("blob_cache.misses")
+        return None
+
+    def schedule_fill(self, file_id: str, size: int):
+        """Copy a file from GridFS to disk in the background after a miss"""
+        if not self.enabled or size > self.max_file_bytes or file_id in self.filling:
+            return
+
+        self.filling.add(file_id)
+        self.stale_fills.discard(file_id)
+        asyncio.create_task(self._fill(file_id))
+
+    async def _fill(self, file_id: str):
+        tmp_path = self.directory / f"{file_id}.part"
+        try:
+            grid_out = await get_fs().open_download_stream(ObjectId(file_id))
+            size = 0
+            async with aiofiles.open(tmp_path, "wb") as f:
+                while True:
+                    chunk = await grid_out.readchunk()
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    await f.write(chunk)
+
+            if file_id in self.stale_fills:
+                # Invalidated while copying - the blob may already be deleted
+                tmp_path.unlink(missing_ok=True)
+                return
+            os.replace(tmp_path, self.path_for(file_id))
+            self._add(file_id, size)
+            self._evict()
+        except Exception as e:
+            tmp_path.unlink(missing_ok=True)
+            print(f"⚠️ Could not cache file {file_id}: {e}")
+        finally:
+            self.filling.discard(file_id)
+            self.stale_fills.discard(file_id)
+
+    def invalidate(self, file_id: str):
+        """Remove a file from the cache (e.g. after its blob is deleted)"""
+        if file_id in self.filling:
+            self.stale_fills.add(file_id)
+        size = self.entries.pop(file_id, None)
+        if size is not None:
+            self.total_bytes -= size
+            self.path_for(file_id).unlink(missing_ok=True)
+
+    def _add(self, file_id: str, size: int):
+        if file_id in self.entries:
+            self.total_bytes -= self.entries[file_id]
+        self.entries[file_id] = size
+        self.total_bytes += size
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            file_id, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            self.path_for(file_id).unlink(missing_ok=True)
+            metrics.inc("blob_cache.evictions")
+
+
+# Global blob cache instance
+blob_cache = BlobCache(
+    settings.BLOB_CACHE_DIR,
+    settings.BLOB_CACHE_MAX_BYTES,
+    settings.BLOB_CACHE_MAX_FILE_BYTES
+)
+
+metrics.gauge("blob_cache.bytes_used", lambda: blob_cache.total_bytes)
+metrics.gauge("blob_cache.files", lambda: len(blob_cache.entries))
+metrics.gauge("blob_cache.hit_ratio", lambda: metrics.ratio("blob_cache.hits", "blob_cache.misses"))
@@ -0,0 +1,157 @@
+from datetime import datetime
+from typing import Iterable, List, Optional
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from utils.db import get_db
+from utils.pagination import Cursor, cursor_query
+
+# How a call ended (CallManager reason) -> history status
+STATUS_BY_REASON = {
+    "ended": "completed",
+    "disconnected": "completed",
+    "declined": "rejected",
+    "missed": "missed"
+}
+
+
+async def record_call(
+    call_id: str,
+    caller_id: str,
+    caller_name: Optional[str],
+    call_type: str,
+    status: str,
+    started_at: datetime,
+    answered_at: Optional[datetime],
+    ended_at: datetime,
+    participants: Iterable[str],
+    missed_by: Iterable[str] = (),
+    callee_id: Optional[str] = None,
+    room_id: Optional[str] = None,
+    replace: bool = True
+) -> str:
+    """
+    Write the history record for a finished call, visible to everyone involved.
+    There is one record per call_id: the server's own record replaces one a
+    client logged first, while replace=False keeps whichever record exists.
+    """
+    participants = sorted(set(participants) | {caller_id} | ({callee_id} if callee_id else set()))
+    missed_by = sorted(set(missed_by))
+
+    record = {
+        "call_id": call_id,
+        "caller_id": caller_id,
+        "caller_name": caller_name or "Unknown",
+        "callee_id": callee_id,
+        "room_id": room_id,
+        "call_type": call_type,
+        "status": status,
+        # Measured on the server from answer to hang-up
+        "duration": int((ended_at - answered_at).total_seconds()) if answered_at else 0,
+        "timestamp": started_at,
+        "answered_at": answered_at,
+        "ended_at": ended_at,
+        "participants": participants,
+        "missed_by": missed_by,
+        # Users who still have this entry in their history (pulled on delete)
+        "visible_to": sorted(set(participants) | set(missed_by))
+    }
+
+    history = get_db().call_history
+    if call_id is None:
+        result = await history.insert_one(record)
+        return str(result.inserted_id)
+
+    if replace:
+        saved = await history.find_one_and_replace(
+            {"call_id": call_id}, record, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    else:
+        saved = await history.find_one_and_update(
+            {"call_id": call_id}, {"$setOnInsert": record}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+    return str(saved["_id"])
+
+
+async def record_call_safely(**fields):
+    """record_call for call teardown paths, which must not fail on a DB error"""
+    try:
+        await record_call(**fields)
+    except Exception as e:
+        print(f"⚠️ Could not record call {fields.get('call_id')}: {e}")
+
+
+async def get_history_page(db, user_id: str, limit: int, before: Optional[Cursor]) -> List[dict]:
+    """One page of a user's call history, newest first, with names resolved in batch"""
+    limit = max(1, min(limit, 100))
+    query = {"visible_to": user_id}
+
+    if before:
+        query.update(cursor_query("timestamp", before))
+
+    calls = await db.call_history.find(query).sort([("timestamp", -1), ("_id", -1)]).limit(limit).to_list(length=limit)
+
+    user_ids = {call["callee_id"] for call in calls if call.get("callee_id")}
+    user_ids |= {call["caller_id"] for call in calls}
+    users = await db.users.find(
+        {"_id": {"$in": [ObjectId(uid) for uid in user_ids if ObjectId.is_valid(uid)]}},
+        {"username": 1}
+    ).to_list(length=None)
+    names = {str(user["_id"]): user.get("username", "Unknown") for user in users}
+
+    room_ids = {call["room_id"] for call in calls if call.get("room_id")}
+    rooms = await db.rooms.find(
+        {"_id": {"$in": [ObjectId(rid) for rid in room_ids if ObjectId.is_valid(rid)]}},
+        {"name": 1}
+    ).to_list(length=None)
+    room_names = {str(room["_id"]): room.get("name", "Group") for room in rooms}
+
+    result = []
+    for call in calls:
+        callee_id = call.get("callee_id")
+        room_id = call.get("room_id")
+        result.append({
+            "id": str(call["_id"]),
+            "call_id": call.get("call_id"),
+            "caller_id": call["caller_id"],
+            "caller_name": names.get(call["caller_id"], call.get("caller_name", "Unknown")),
+            "callee_id": callee_id,
+            "callee_name": names.get(callee_id) if callee_id else room_names.get(room_id, "Group"),
+            "room_id": room_id,
+            "call_type": call["call_type"],
+            "status": call["status"],
+            "duration": call.get("duration", 0),
+            "participants": call.get("participants", []),
+            "timestamp": call["timestamp"].isoformat(),
+            # Pass as ?before= to fetch the next page
+            "cursor": f"{call['timestamp'].isoformat()}|{call['_id']}",
+            "is_outgoing": call["caller_id"] == user_id
+        })
+
+    return result
+
+
+async def count_missed(db, user_id: str, since: Optional[datetime] = None) -> int:
+    """Missed calls for the badge, counted on the (missed_by, timestamp) index"""
+    query = {"missed_by": user_id}
+    if since:
+        query["timestamp"] = {"$gt": since}
+    return await db.call_history.count_documents(query)
+
+
+async def hide_calls(db, user_id: str, call_ids: Optional[List[ObjectId]] = None) -> int:
+    """
+    Remove entries from one user's history. Records are shared between
+    participants, so they are only deleted once nobody can see them.
+    """
+    query = {"visible_to": user_id}
+    if call_ids is not None:
+        query["_id"] = {"$in": call_ids}
+
+    # Entries only this user can still see are deleted outright
+    deleted = await db.call_history.delete_many({**query, "visible_to": [user_id]})
+    updated = await db.call_history.update_many(
+        query,
+        {"$pull": {"visible_to": user_id, "missed_by": user_id}}
+    )
+    return deleted.deleted_count + updated.modified_count
@@ -0,0 +1,78 @@
+from typing import Dict, Iterable, Optional
+from bson import ObjectId
+
+from config import settings
+from utils.cache import TTLCache
+
+# file_id -> public file info; GridFS files are immutable apart from thumbnail metadata
+file_info_cache = TTLCache(
+    max_size=settings.FILE_INFO_CACHE_SIZE,
+    ttl=settings.FILE_INFO_CACHE_TTL_SECONDS
+)
+
+FILE_INFO_PROJECTION = {"length": 1, "metadata": 1}
+
+
+def build_file_info(file_doc: dict) -> dict:
+    """Public view of an fs.files document"""
+    metadata = file_doc.get("metadata") or {}
+    return {
+        "file_id": str(file_doc["_id"]),
+        "filename": metadata.get("original_filename", "file"),
+        "size": metadata.get("size", file_doc.get("length", 0)),
+        "content_type": metadata.get("content_type", "application/octet-stream"),
+        "uploaded_by": metadata.get("uploaded_by"),
+        "thumbnails": metadata.get("thumbnails"),
+        "placeholder": metadata.get("placeholder")
+    }
+
+
+def blob_id_of(file_doc: dict) -> ObjectId:
+    """GridFS file holding an upload's content (the upload itself if stored before deduplication)"""
+    return (file_doc.get("metadata") or {}).get("blob_id") or file_doc["_id"]
+
+
+async def open_content(fs, file_doc: dict):
+    """
+    Open an upload's content for reading. Per-upload documents have no chunks
+    of their own, so content must always be read through this (or blob_id_of).
+    """
+    return await fs.open_download_stream(blob_id_of(file_doc))
+
+
+async def get_stored_file(db, file_id) -> Optional[dict]:
+    """fs.files document of an upload; shared content blobs are not addressable"""
+    if not ObjectId.is_valid(str(file_id)):
+        return None
+    return await db["fs.files"].find_one({"_id": ObjectId(str(file_id)), "metadata.blob": {"$ne": True}})
+
+
+async def get_file_infos(db, file_ids: Iterable[Optional[str]]) -> Dict[str, dict]:
+    """File info for many ids: cached entries plus one fs.files query for the rest"""
+    infos = {}
+    missing = []
+
+    for file_id in set(filter(None, file_ids)):
+        cached = file_info_cache.get(file_id)
+        if cached is not None:
+            infos[file_id] = cached
+        elif ObjectId.is_valid(file_id):
+            missing.append(ObjectId(file_id))
+
+    if missing:
+        files = await db["fs.files"].find(
+            {"_id": {"$in": missing}, "metadata.blob": {"$ne": True}},
+            FILE_INFO_PROJECTION
+        ).to_list(length=len(missing))
+
+        for file_doc in files:
+            info = build_file_info(file_doc)
+            file_info_cache.set(info["file_id"], info)
+            infos[info["file_id"]] = info
+
+    return infos
+
+
+def invalidate_file_info(file_id):
+    """Drop cached info after a file's metadata changes or it is deleted"""
+    file_info_cache.pop(str(file_id))
@@ -0,0 +1,95 @@
+from typing import List, Optional
+from datetime import datetime
+from bson import ObjectId
+
+from config import settings
+from utils.db import get_db
+from services.metrics import metrics
+from services.websocket import manager
+from services.webrtc import ice_batcher, relay
+
+# Peer-to-peer messages of the group call mesh
+RELAYED_TYPES = ("group_call_offer", "group_call_answer", "group_call_ice")
+
+
+class GroupSignalingError(Exception):
+    """A group call message was rejected; the text is sent back to the sender"""
+
+
+async def room_member_ids(room_id: Optional[str]) -> List[str]:
+    if not room_id or not ObjectId.is_valid(room_id):
+        return []
+    room = await get_db().rooms.find_one({"_id": ObjectId(room_id)}, {"members": 1})
+    return room.get("members", []) if room else []
+
+
+async def start_group_call(initiator_id: str, initiator_name: str, room_id: str,
+                           call_type: str, call_id: Optional[str]) -> str:
+    """Start a call in a room the initiator belongs to, ringing its online members"""
+    members = await room_member_ids(room_id)
+    if initiator_id not in members:
+        raise GroupSignalingError("Not a member of this room")
+    if manager.get_group_call(room_id):
+        raise GroupSignalingError("A call is already active in this room")
+
+    ring = [member for member in members if member != initiator_id and manager.is_online(member)]
+    return await manager.start_group_call(room_id, initiator_id, initiator_name, call_type, call_id, ring)
+
+
+async def join_group_call(user_id: str, user_name: str, room_id: str) -> dict:
+    """Join a room's active call, within the participant limit"""
+    call = manager.get_group_call(room_id)
+    if not call:
+        raise GroupSignalingError("No active call in this room")
+
+    if user_id not in call["participants"]:
+        if user_id not in call["rung"] and user_id not in await room_member_ids(room_id):
+            raise GroupSignalingError("Not a member of this room")
+        if len(call["participants"]) >= settings.GROUP_CALL_MAX_PARTICIPANTS:
+            metrics.inc("group_signaling.full")
+            raise GroupSignalingError("Call is full")
+
+    if user_id not in call["joined"]:
+        started_at = datetime.fromisoformat(call["started_at"])
+        metrics.observe("group_calls.time_to_join_ms", (datetime.utcnow() - started_at).total_seconds() * 1000)
+
+    return await manager.join_group_call(room_id, user_id, user_name)
+
+
+async def relay_group_signal(sender_id: str, sender_name: str, data: dict):
+    """Relay an offer, answer or ICE candidate between two participants of the same call"""
+    msg_type = data.get("type")
+    room_id = data.get("room_id")
+    to_user = data.get("to")
+
+    call = manager.get_group_call(room_id)
+    participants = call["participants"] if call else set()
+    if sender_id not in participants or to_user not in participants or to_user == sender_id:
+        metrics.inc("group_signaling.rejected")
+        raise GroupSignalingError("Not a participant of this call")
+
+    # Per-call signaling volume, reported when the call ends
+    signaling = call.setdefault("signaling", {})
+    signaling[msg_type] = signaling.get(msg_type, 0) + 1
+    metrics.inc(f"group_signaling.{msg_type}")
+
+    if msg_type == "group_call_ice":
+        candidate = data.get("candidate")
+        await ice_batcher.add(
+            (call["call_id"], sender_id, to_user),
+            {"type": "group_call_ice", "from": sender_id, "room_id": room_id},
+            candidate,
+            call,
+            end_of_candidates=candidate is None or data.get("end_of_candidates", False)
+        )
+        return
+
+    message = {
+        "type": msg_type,
+        "from": sender_id,
+        "room_id": room_id,
+        "sdp": data.get("sdp")
+    }
+    if msg_type == "group_call_offer":
+        message["from_name"] = sender_name
+    await relay(to_user, message, metric="group_signaling.relay_ms")
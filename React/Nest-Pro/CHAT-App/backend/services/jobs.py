@@ -0,0 +1,262 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+from datetime import datetime
+from bson import ObjectId
+import asyncio
+
+from config import settings
+from utils.db import get_db
+from services.websocket import manager
+from services.reply_previews import invalidate_reply_preview
+
+# Job lifecycle: pending -> running -> done | failed
+JOB_PENDING = "pending"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+# Job types run on named queues with their own workers, so slow bulk deletes
+# never hold up latency-sensitive work like thumbnails
+DEFAULT_QUEUE = "default"
+
+JobHandler = Callable[[dict, Callable[..., Awaitable[None]]], Awaitable[None]]
+
+
+class JobQueue:
+    """Mongo-backed background job queue with an in-process worker pool"""
+
+    def __init__(self):
+        self.handlers: Dict[str, JobHandler] = {}
+        # job_type -> queue name
+        self.job_queues: Dict[str, str] = {}
+        # queue name -> number of workers
+        self.queue_workers: Dict[str, int] = {DEFAULT_QUEUE: settings.JOB_WORKERS}
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.workers: List[asyncio.Task] = []
+
+    def add_queue(self, name: str, num_workers: int):
+        """Declare a queue with its own worker pool"""
+        self.queue_workers[name] = num_workers
+
+    def register(self, job_type: str, handler: JobHandler, queue: str = DEFAULT_QUEUE):
+        """Register the coroutine that performs a job type"""
+        if queue not in self.queue_workers:
+            raise ValueError(f"Unknown job queue: {queue}")
+        self.handlers[job_type] = handler
+        self.job_queues[job_type] = queue
+
+    def _queue_for(self, job_type: str) -> Optional[asyncio.Queue]:
+        return self.queues.get(self.job_queues.get(job_type, DEFAULT_QUEUE))
+
+    async def start(self):
+        """Start workers and resume jobs left unfinished by a previous run"""
+        db = get_db()
+        self.queues = {name: asyncio.Queue() for name in self.queue_workers}
+        
+        # Jobs finished before finished_at existed get one so the TTL index expires them
+        await db.jobs.update_many(
+            {"status": {"$in": [JOB_DONE, JOB_FAILED]}, "finished_at": {"$exists": False}},
+            [{"$set": {"finished_at": "$updated_at"}}]
+        )
+
+        # Jobs that were running when the server stopped are picked up again;
+        # handlers work in idempotent batches so they continue where they left off
+        await db.jobs.update_many(
+            {"status": JOB_RUNNING},
+            {"$set": {"status": JOB_PENDING, "updated_at": datetime.utcnow()}}
+        )
+        pending = await db.jobs.find({"status": JOB_PENDING}, {"_id": 1, "type": 1}).sort("created_at", 1).to_list(length=None)
+        for job in pending:
+            queue = self._queue_for(job.get("type"))
+            if queue is not None:
+                queue.put_nowait(job["_id"])
+
+        for name, num_workers in self.queue_workers.items():
+            for _ in range(num_workers):
+                self.workers.append(asyncio.create_task(self._worker(self.queues[name])))
+
+        if pending:
+            print(f"🔁 Resumed {len(pending)} background job(s)")
+
+    async def stop(self):
+        """Stop workers; unfinished jobs resume on next start"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+
+    async def enqueue(self, job_type: str, params: dict, owner_id: str = None, notify_room: str = None) -> dict:
+        """Persist a job and hand it to the worker pool"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        now = datetime.utcnow()
+        job = {
+            "type": job_type,
+            "params": params,
+            "owner_id": owner_id,
+            "notify_room": notify_room,
+            "status": JOB_PENDING,
+            "processed": 0,
+            "total": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+
+        await get_db().jobs.insert_one(job)
+        queue = self._queue_for(job_type)
+        if queue is not None:
+            queue.put_nowait(job["_id"])
+
+        return job
+
+    async def get_job(self, job_id: str) -> Optional[dict]:
+        """Get a job by ID"""
+        if not ObjectId.is_valid(job_id):
+            return None
+        return await get_db().jobs.find_one({"_id": ObjectId(job_id)})
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            job_id = await queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Background job {job_id} crashed: {e}")
+            finally:
+                queue.task_done()
+
+    async def _run(self, job_id: ObjectId):
+        db = get_db()
+
+        # Claim the job so it is never run twice
+        job = await db.jobs.find_one_and_update(
+            {"_id": job_id, "status": JOB_PENDING},
+            {"$set": {"status": JOB_RUNNING, "updated_at": datetime.utcnow()}},
+            return_document=True
+        )
+        if not job:
+            return
+
+        async def report(processed: int, total: int = None):
+            update = {"processed": processed, "updated_at": datetime.utcnow()}
+            if total is not None:
+                update["total"] = total
+            job.update(update)
+            await db.jobs.update_one({"_id": job_id}, {"$set": update})
+            await self._notify(job)
+
+        try:
+            await self.handlers[job["type"]](job, report)
+            job["status"] = JOB_DONE
+        except asyncio.CancelledError:
+            # Shutting down - leave the job running so it resumes on next start
+            raise
+        except Exception as e:
+            job["status"] = JOB_FAILED
+            job["error"] = str(e)
+
+        job["updated_at"] = datetime.utcnow()
+        await db.jobs.update_one(
+            {"_id": job_id},
+            # finished_at drives the TTL index that prunes old jobs
+            {"$set": {"status": job["status"], "error": job["error"], "updated_at": job["updated_at"], "finished_at": job["updated_at"]}}
+        )
+        await self._notify(job)
+
+    async def _notify(self, job: dict):
+        """Push job progress to the owner and the affected room"""
+        event = {"type": "job_progress", **serialize_job(job)}
+
+        if job.get("owner_id"):
+            await manager.send_personal(job["owner_id"], event)
+        if job.get("notify_room"):
+            await manager.broadcast_to_room(job["notify_room"], event, exclude_user=job.get("owner_id"))
+
+
+def serialize_job(job: dict) -> dict:
+    """Public view of a job"""
+    return {
+        "job_id": str(job["_id"]),
+        "job_type": job["type"],
+        "status": job["status"],
+        "processed": job.get("processed", 0),
+        "total": job.get("total"),
+        "error": job.get("error"),
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat()
+    }
+
+
+async def run_in_batches(collection, query: dict, report, update: dict = None, processed: int = 0,
+                         on_batch: Callable[[List[ObjectId]], None] = None):
+    """
+    Delete (or update) documents matching query in rate-limited batches.
+    The query must stop matching processed documents so a resumed job continues.
+    """
+    total = processed + await collection.count_documents(query)
+    await report(processed, total)
+
+    while True:
+        batch = await collection.find(query, {"_id": 1}).limit(settings.JOB_BATCH_SIZE).to_list(length=settings.JOB_BATCH_SIZE)
+        if not batch:
+            break
+
+        ids = [doc["_id"] for doc in batch]
+        if update is None:
+            await collection.delete_many({"_id": {"$in": ids}})
+        else:
+            await collection.update_many({"_id": {"$in": ids}}, update)
+        if on_batch:
+            on_batch(ids)
+
+        processed += len(ids)
+        await report(processed)
+        await asyncio.sleep(settings.JOB_BATCH_DELAY_SECONDS)
+
+
+# ============ JOB HANDLERS ============
+
+def forget_reply_previews(message_ids: List[ObjectId]):
+    """Cached previews of deleted messages must not outlive them"""
+    for message_id in message_ids:
+        invalidate_reply_preview(str(message_id))
+
+
+def chat_messages_query(chat_id: str) -> dict:
+    """Messages belonging to a chat (room or direct)"""
+    return {"$or": [{"chat_id": chat_id}, {"receiver_id": chat_id}, {"sender_id": chat_id}]}
+
+
+async def delete_room_messages(job: dict, report):
+    """Delete all messages in a deleted room"""
+    query = {"room_id": job["params"]["room_id"]}
+    await run_in_batches(get_db().messages, query, report, processed=job.get("processed", 0),
+                         on_batch=forget_reply_previews)
+    await get_db().chat_media.delete_many(query)
+
+
+async def clear_chat_messages(job: dict, report):
+    """Soft delete all messages in a chat"""
+    query = {**chat_messages_query(job["params"]["chat_id"]), "deleted": {"$ne": True}}
+    update = {"$set": {"deleted": True, "deleted_at": job["created_at"]}}
+    await run_in_batches(get_db().messages, query, report, update=update, processed=job.get("processed", 0),
+                         on_batch=forget_reply_previews)
+    await get_db().chat_media.delete_many(chat_messages_query(job["params"]["chat_id"]))
+
+
+async def delete_chat_messages(job: dict, report):
+    """Permanently delete all messages in a chat"""
+    query = chat_messages_query(job["params"]["chat_id"])
+    await run_in_batches(get_db().messages, query, report, processed=job.get("processed", 0),
+                         on_batch=forget_reply_previews)
+    await get_db().chat_media.delete_many(query)
+
+
+# Global job queue instance
+job_queue = JobQueue()
+job_queue.register("delete_room_messages", delete_room_messages)
+job_queue.register("clear_chat_messages", clear_chat_messages)
+job_queue.register("delete_chat_messages", delete_chat_messages)
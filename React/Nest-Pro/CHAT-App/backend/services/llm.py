@@ -0,0 +1,121 @@
+from abc import ABC, abstractmethod
+from typing import Dict, Iterator, List, Type
+import hashlib
+import time
+
+from config import settings
+
+try:
+    import google.generativeai as genai
+except ImportError:  # only needed for the Gemini provider
+    genai = None
+
+
+class LLMProvider(ABC):
+    """
+    Model backend used by Arise. Methods are blocking (like the vendor SDKs)
+    and are run on the AI executor's worker pool.
+
+    History is a list of {"role": "user" | "assistant", "content": str}.
+    """
+
+    name = "base"
+    default_model = ""
+
+    @property
+    def available(self) -> bool:
+        return True
+
+    @abstractmethod
+    def generate(self, model: str, history: List[dict], prompt: str) -> str:
+        """Return the complete reply"""
+
+    @abstractmethod
+    def stream(self, model: str, history: List[dict], prompt: str) -> Iterator[str]:
+        """Yield the reply in chunks as they are produced"""
+
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini via google.generativeai"""
+
+    name = "gemini"
+    default_model = "gemini-2.5-flash"
+
+    def __init__(self):
+        if self.available:
+            genai.configure(api_key=settings.GEMINI_API_KEY)
+
+    @property
+    def available(self) -> bool:
+        return genai is not None and bool(settings.GEMINI_API_KEY)
+
+    @staticmethod
+    def _history(messages: List[dict]) -> List[dict]:
+        history = []
+        for msg in messages:
+            role = "user" if msg.get("role") == "user" else "model"
+            history.append({"role": role, "parts": [msg.get("content", "")]})
+        return history
+
+    def generate(self, model: str, history: List[dict], prompt: str) -> str:
+        gemini = genai.GenerativeModel(model)
+        if not history:
+            return gemini.generate_content(prompt).text
+        return gemini.start_chat(history=self._history(history)).send_message(prompt).text
+
+    def stream(self, model: str, history: List[dict], prompt: str) -> Iterator[str]:
+        chat = genai.GenerativeModel(model).start_chat(history=self._history(history))
+        for chunk in chat.send_message(prompt, stream=True):
+            yield chunk.text
+
+
+class LocalProvider(LLMProvider):
+    """
+    Offline stand-in for load tests and benchmarks. Replies are deterministic
+    for a given model, history and prompt, and are produced with simulated
+    first-token and per-token latency.
+    """
+
+    name = "local"
+    default_model = "local-arise"
+
+    VOCABULARY = (
+        "idea", "plan", "team", "next", "step", "review", "design", "ship", "test", "share",
+        "focus", "goal", "draft", "clear", "simple", "build", "measure", "learn", "iterate", "sync"
+    )
+
+    def _tokens(self, model: str, history: List[dict], prompt: str) -> List[str]:
+        seed = "\x1f".join([model, prompt] + [f"{m.get('role')}:{m.get('content', '')}" for m in history])
+        digest = hashlib.sha256(seed.encode()).digest()
+        return [
+            self.VOCABULARY[digest[i % len(digest)] % len(self.VOCABULARY)]
+            for i in range(settings.LOCAL_LLM_RESPONSE_TOKENS)
+        ]
+
+    def stream(self, model: str, history: List[dict], prompt: str) -> Iterator[str]:
+        time.sleep(settings.LOCAL_LLM_FIRST_TOKEN_MS / 1000)
+        for i, token in enumerate(self._tokens(model, history, prompt)):
+            if i:
+                time.sleep(settings.LOCAL_LLM_TOKEN_MS / 1000)
+            yield token if i == 0 else f" {token}"
+
+    def generate(self, model: str, history: List[dict], prompt: str) -> str:
+        tokens = self._tokens(model, history, prompt)
+        time.sleep((settings.LOCAL_LLM_FIRST_TOKEN_MS + settings.LOCAL_LLM_TOKEN_MS * (len(tokens) - 1)) / 1000)
+        return " ".join(tokens)
+
+
+PROVIDERS: Dict[str, Type[LLMProvider]] = {
+    GeminiProvider.name: GeminiProvider,
+    LocalProvider.name: LocalProvider
+}
+
+
+def create_provider(name: str) -> LLMProvider:
+    if name not in PROVIDERS:
+        raise ValueError(f"Unknown LLM_PROVIDER '{name}', expected one of: {', '.join(PROVIDERS)}")
+    return PROVIDERS[name]()
+
+
+# Provider used by all Arise endpoints
+llm = create_provider(settings.LLM_PROVIDER)
@@ -0,0 +1,88 @@
+from typing import List, Optional
+import mimetypes
+import re
+
+# Categories shown in the media/links/docs panel
+CATEGORY_MEDIA = "media"
+CATEGORY_LINK = "link"
+CATEGORY_DOC = "doc"
+CATEGORIES = (CATEGORY_MEDIA, CATEGORY_LINK, CATEGORY_DOC)
+
+URL_PATTERN = re.compile(r"https?://[^\s<>\"']+", re.IGNORECASE)
+MEDIA_MESSAGE_TYPES = {"image", "video"}
+
+
+def chat_key(sender_id: str, receiver_id: Optional[str] = None, room_id: Optional[str] = None) -> str:
+    """Stable key for a conversation: the room, or the sorted pair of users"""
+    if room_id:
+        return f"room:{room_id}"
+    return "dm:" + ":".join(sorted([sender_id, receiver_id or ""]))
+
+
+def classify_file(message: dict) -> str:
+    """Media for images/videos, docs for every other attachment"""
+    if message.get("message_type") in MEDIA_MESSAGE_TYPES:
+        return CATEGORY_MEDIA
+
+    guessed = mimetypes.guess_type(message.get("file_name") or "")[0] or ""
+    if guessed.startswith(("image/", "video/")):
+        return CATEGORY_MEDIA
+    return CATEGORY_DOC
+
+
+def extract_entries(message: dict) -> List[dict]:
+    """Index entries (attachment plus any links in the text) for a stored message"""
+    base = {
+        "chat_key": chat_key(message["sender_id"], message.get("receiver_id"), message.get("room_id")),
+        "message_id": str(message["_id"]),
+        "sender_id": message["sender_id"],
+        "receiver_id": message.get("receiver_id"),
+        "room_id": message.get("room_id"),
+        "message_type": message.get("message_type", "text"),
+        "timestamp": message["timestamp"]
+    }
+
+    entries = []
+    if message.get("file_id"):
+        entries.append({
+            **base,
+            "category": classify_file(message),
+            "file_id": message["file_id"],
+            "file_name": message.get("file_name"),
+            "file_size": message.get("file_size")
+        })
+
+    seen = set()
+    for url in URL_PATTERN.findall(message.get("content") or ""):
+        url = url.rstrip(".,;:!?)")
+        if url not in seen:
+            seen.add(url)
+            entries.append({**base, "category": CATEGORY_LINK, "url": url})
+
+    return entries
+
+
+async def index_message(db, message: dict):
+    """Record a new message's media, links and docs in the per-chat index"""
+    entries = extract_entries(message)
+    if entries:
+        await db.chat_media.insert_many(entries)
+
+
+async def remove_message(db, message_id: str):
+    """Drop a deleted message from the index"""
+    await db.chat_media.delete_many({"message_id": message_id})
+
+
+def serialize_entry(entry: dict) -> dict:
+    return {
+        "message_id": entry["message_id"],
+        "category": entry["category"],
+        "sender_id": entry["sender_id"],
+        "message_type": entry.get("message_type"),
+        "file_id": entry.get("file_id"),
+        "file_name": entry.get("file_name"),
+        "file_size": entry.get("file_size"),
+        "url": entry.get("url"),
+        "timestamp": entry["timestamp"].isoformat()
+    }
@@ -0,0 +1,58 @@
+from typing import Optional, Tuple
+from pymongo.errors import DuplicateKeyError
+
+from config import settings
+from utils.cache import TTLCache
+
+# (sender_id, client_id) -> message _id of recently stored sends
+recent_messages = TTLCache(
+    max_size=settings.MESSAGE_DEDUP_CACHE_SIZE,
+    ttl=settings.MESSAGE_DEDUP_TTL_SECONDS
+)
+
+
+def normalize_client_id(client_id) -> Optional[str]:
+    """Accept only short string ids generated by the client"""
+    if isinstance(client_id, str) and 0 < len(client_id) <= 64:
+        return client_id
+    return None
+
+
+async def find_duplicate(db, sender_id: str, client_id: Optional[str]) -> Optional[dict]:
+    """Return the stored message for a send retried within the dedup window"""
+    if not client_id:
+        return None
+
+    message_id = recent_messages.get((sender_id, client_id))
+    if message_id is None:
+        return None
+
+    return await db.messages.find_one({"_id": message_id})
+
+
+async def insert_message(db, message_doc: dict) -> Tuple[dict, bool]:
+    """
+    Insert a message once per (sender_id, client_id).
+    Returns the stored message and whether it was newly created.
+    """
+    sender_id = message_doc["sender_id"]
+    client_id = message_doc.get("client_id")
+
+    existing = await find_duplicate(db, sender_id, client_id)
+    if existing:
+        return existing, False
+
+    try:
+        await db.messages.insert_one(message_doc)
+    except DuplicateKeyError:
+        # Retry raced past the recently-seen set; the unique index caught it
+        existing = await db.messages.find_one({"sender_id": sender_id, "client_id": client_id})
+        if not existing:
+            raise
+        recent_messages.set((sender_id, client_id), existing["_id"])
+        return existing, False
+
+    if client_id:
+        recent_messages.set((sender_id, client_id), message_doc["_id"])
+
+    return message_doc, True
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from typing import Callable, Dict, Optional, Sequence
+import bisect
+
+# Default histogram buckets (upper bounds) suited to millisecond latencies
+DEFAULT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class Histogram:
+    """Fixed-bucket histogram"""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "avg": round(self.sum / self.count, 3) if self.count else 0,
+            "buckets": {
+                **{str(bound): count for bound, count in zip(self.buckets, self.counts)},
+                "+Inf": self.counts[-1]
+            }
+        }
+
+
+class Metrics:
+    """In-process counters, gauges and histograms exposed at /api/metrics"""
+
+    def __init__(self):
+        self.counters: Dict[str, float] = defaultdict(float)
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def inc(self, name: str, value: float = 1):
+        """Increment a counter"""
+        self.counters[name] += value
+
+    def gauge(self, name: str, func: Callable[[], float]):
+        """Register a gauge read from func at snapshot time"""
+        self.gauges[name] = func
+
+    def observe(self, name: str, value: float, buckets: Optional[Sequence[float]] = None):
+        """Record a value in a histogram"""
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(buckets or DEFAULT_BUCKETS)
+        self.histograms[name].observe(value)
+
+    def ratio(self, hits: str, misses: str) -> float:
+        """Hit ratio of two counters"""
+        total = self.counters[hits] + self.counters[misses]
+        return round(self.counters[hits] / total, 4) if total else 0.0
+
+    def snapshot(self) -> dict:
+        gauges = {}
+        for name, func in self.gauges.items():
+            try:
+                gauges[name] = func()
+            except Exception:
+                gauges[name] = None
+
+        return {
+            "counters": dict(self.counters),
+            "gauges": gauges,
+            "histograms": {name: h.snapshot() for name, h in self.histograms.items()}
+        }
+
+
+# Global metrics registry
+metrics = Metrics()
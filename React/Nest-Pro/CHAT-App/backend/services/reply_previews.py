@@ -0,0 +1,109 @@
+from typing import Dict, Iterable, Optional, Tuple
+from bson import ObjectId
+
+from config import settings
+from utils.cache import TTLCache
+from services.media_index import chat_key
+
+# Length of the quoted text shown in reply bubbles
+SNIPPET_LENGTH = 100
+
+# message_id -> (conversation, compact preview) of recently quoted messages
+reply_preview_cache = TTLCache(
+    max_size=settings.REPLY_PREVIEW_CACHE_SIZE,
+    ttl=settings.REPLY_PREVIEW_CACHE_TTL_SECONDS
+)
+
+
+def build_reply_preview(message: dict, sender_name: str) -> dict:
+    """Build the compact preview embedded in reply bubbles"""
+    if message.get("deleted"):
+        snippet = "This message was deleted"
+    else:
+        snippet = message.get("content") or message.get("file_name") or ""
+
+    return {
+        "id": str(message["_id"]),
+        "sender_id": message.get("sender_id"),
+        "sender_name": sender_name,
+        "snippet": snippet[:SNIPPET_LENGTH],
+        "message_type": message.get("message_type", "text"),
+        "deleted": message.get("deleted", False)
+    }
+
+
+def message_chat(message: dict) -> str:
+    """Conversation a message belongs to"""
+    return chat_key(message.get("sender_id", ""), message.get("receiver_id"), message.get("room_id"))
+
+
+async def resolve_reply_previews(db, messages: Iterable[dict]) -> Dict[Tuple[str, str], dict]:
+    """
+    Resolve previews for the messages quoted by a page of messages with one
+    batched lookup. A quote only resolves when the quoted message is in the
+    same conversation; look results up with reply_preview_for.
+    """
+    quotes = {
+        (message_chat(msg), msg["reply_to"]) for msg in messages
+        if isinstance(msg.get("reply_to"), str)
+    }
+    entries = {}
+    missing = []
+
+    for _, reply_id in quotes:
+        if reply_id in entries:
+            continue
+        cached = reply_preview_cache.get(reply_id)
+        if cached is not None:
+            entries[reply_id] = cached
+        elif ObjectId.is_valid(reply_id):
+            missing.append(ObjectId(reply_id))
+
+    if missing:
+        messages = await db.messages.find(
+            {"_id": {"$in": missing}},
+            {"sender_id": 1, "receiver_id": 1, "room_id": 1, "content": 1, "message_type": 1, "file_name": 1, "deleted": 1}
+        ).to_list(length=len(missing))
+
+        sender_ids = list({
+            ObjectId(msg["sender_id"]) for msg in messages if ObjectId.is_valid(msg.get("sender_id", ""))
+        })
+        senders = {}
+        if sender_ids:
+            users = await db.users.find(
+                {"_id": {"$in": sender_ids}},
+                {"username": 1}
+            ).to_list(length=len(sender_ids))
+            senders = {str(user["_id"]): user.get("username", "Unknown") for user in users}
+
+        for msg in messages:
+            preview = build_reply_preview(msg, senders.get(msg.get("sender_id"), "Unknown"))
+            # Cached with its conversation so later lookups are scoped too
+            entries[preview["id"]] = (message_chat(msg), preview)
+            reply_preview_cache.set(preview["id"], entries[preview["id"]])
+
+    previews = {}
+    for chat, reply_id in quotes:
+        entry = entries.get(reply_id)
+        if entry and entry[0] == chat:
+            previews[(chat, reply_id)] = entry[1]
+    return previews
+
+
+def reply_preview_for(previews: Dict[Tuple[str, str], dict], message: dict) -> Optional[dict]:
+    """Preview of the message quoted by message, from resolve_reply_previews results"""
+    if not message.get("reply_to"):
+        return None
+    return previews.get((message_chat(message), message["reply_to"]))
+
+
+async def get_reply_preview(db, message: dict) -> Optional[dict]:
+    """Resolve the preview for the message quoted by a single message"""
+    if not message.get("reply_to"):
+        return None
+    return reply_preview_for(await resolve_reply_previews(db, [message]), message)
+
+
+def invalidate_reply_preview(message_id: str):
+    """Drop a cached preview after the quoted message changes"""
+    reply_preview_cache.pop(message_id)
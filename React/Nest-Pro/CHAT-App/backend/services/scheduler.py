@@ -0,0 +1,41 @@
+from typing import Awaitable, Callable, Dict, List, Tuple
+import asyncio
+
+
+class Scheduler:
+    """Runs periodic maintenance jobs on fixed intervals"""
+
+    def __init__(self):
+        # name -> (interval_seconds, coroutine function)
+        self.jobs: Dict[str, Tuple[float, Callable[[], Awaitable[None]]]] = {}
+        self.tasks: List[asyncio.Task] = []
+
+    def add(self, name: str, interval_seconds: float, func: Callable[[], Awaitable[None]]):
+        """Register a coroutine function to run every interval_seconds (re-adding a name replaces it)"""
+        self.jobs[name] = (interval_seconds, func)
+
+    async def start(self):
+        """Start all registered jobs"""
+        for name, (interval, func) in self.jobs.items():
+            self.tasks.append(asyncio.create_task(self._run(name, interval, func)))
+
+    async def stop(self):
+        """Stop all running jobs"""
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _run(self, name: str, interval: float, func: Callable[[], Awaitable[None]]):
+        while True:
+            try:
+                await func()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"⚠️ Scheduled job '{name}' failed: {e}")
+            await asyncio.sleep(interval)
+
+
+# Global scheduler instance
+scheduler = Scheduler()
@@ -0,0 +1,193 @@
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from config import settings
+from utils.cache import TTLCache
+from services.status_views import viewed_status_ids
+
+# Status expires after 24 hours
+STATUS_EXPIRY_HOURS = settings.STATUS_EXPIRY_HOURS
+
+# owner_id -> {"recent": [...], "viewed": [...]} as served by /api/status/contacts
+status_feed_cache = TTLCache(
+    max_size=settings.STATUS_FEED_CACHE_SIZE,
+    ttl=settings.STATUS_FEED_CACHE_TTL_SECONDS
+)
+
+
+def status_cutoff(now: Optional[datetime] = None) -> datetime:
+    """Oldest created_at that is still visible"""
+    return (now or datetime.utcnow()) - timedelta(hours=STATUS_EXPIRY_HOURS)
+
+
+def invalidate_feeds(owner_ids: Iterable[str]):
+    for owner_id in owner_ids:
+        status_feed_cache.pop(owner_id)
+
+
+def _feed_entry(status: dict, viewed: bool = False) -> dict:
+    return {"id": str(status["_id"]), "created_at": status["created_at"], "viewed": viewed}
+
+
+def _contact_fields(contact: dict, latest: datetime) -> dict:
+    return {
+        "username": contact.get("username", "Unknown"),
+        "avatar": contact.get("avatar"),
+        "latest": latest,
+        "expires_at": latest + timedelta(hours=STATUS_EXPIRY_HOURS)
+    }
+
+
+async def status_readers(db, author_id: str) -> List[str]:
+    """Users who see the author's statuses, i.e. have the author as a contact"""
+    readers = await db.users.find({"contacts": author_id}, {"_id": 1}).to_list(None)
+    return [str(reader["_id"]) for reader in readers]
+
+
+async def fan_out_status(db, author: dict, status: dict) -> List[str]:
+    """Push a new status into the feed of everyone who has the author as a contact"""
+    author_id = str(author["_id"])
+    reader_ids = await status_readers(db, author_id)
+    if not reader_ids:
+        return reader_ids
+
+    # Drop expired entries first; a single update can't $push and $pull one array
+    await db.status_feeds.update_many(
+        {"contact_id": author_id},
+        {"$pull": {"statuses": {"created_at": {"$lt": status_cutoff()}}}}
+    )
+
+    entry = _feed_entry(status)
+    fields = _contact_fields(author, status["created_at"])
+    await db.status_feeds.bulk_write([
+        UpdateOne(
+            {"owner_id": reader_id, "contact_id": author_id},
+            {"$push": {"statuses": entry}, "$set": fields},
+            upsert=True
+        )
+        for reader_id in reader_ids
+    ], ordered=False)
+
+    invalidate_feeds(reader_ids)
+    return reader_ids
+
+
+async def remove_status_from_feeds(db, author_id: str, status_id: str):
+    """Pull a deleted status out of every feed that holds it"""
+    owner_ids = await db.status_feeds.distinct("owner_id", {"contact_id": author_id})
+    await db.status_feeds.update_many(
+        {"contact_id": author_id},
+        {"$pull": {"statuses": {"id": status_id}}}
+    )
+    invalidate_feeds(owner_ids)
+
+
+async def refresh_contact_profile(db, contact: dict):
+    """Copy a changed username/avatar into every feed entry for that contact"""
+    contact_id = str(contact["_id"])
+    owner_ids = await db.status_feeds.distinct("owner_id", {"contact_id": contact_id})
+    if not owner_ids:
+        return
+
+    await db.status_feeds.update_many(
+        {"contact_id": contact_id},
+        {"$set": {"username": contact.get("username", "Unknown"), "avatar": contact.get("avatar")}}
+    )
+    invalidate_feeds(owner_ids)
+
+
+async def mark_feed_viewed(db, viewer_id: str, author_id: str, status_ids: List[str]):
+    """Flag statuses as viewed in the viewer's feed entry for the author"""
+    if not status_ids:
+        return
+
+    await db.status_feeds.update_one(
+        {"owner_id": viewer_id, "contact_id": author_id},
+        {"$set": {"statuses.$[s].viewed": True}},
+        array_filters=[{"s.id": {"$in": status_ids}}]
+    )
+    status_feed_cache.pop(viewer_id)
+
+
+async def sync_feed_entry(db, owner_id: str, contact_id: str):
+    """Rebuild one feed entry from the contact's live statuses, e.g. after adding a contact"""
+    statuses = await db.statuses.find(
+        {"user_id": contact_id, "created_at": {"$gte": status_cutoff()}},
+        {"created_at": 1}
+    ).sort("created_at", 1).to_list(None)
+
+    status_feed_cache.pop(owner_id)
+    if not statuses:
+        return
+
+    contact = await db.users.find_one({"_id": ObjectId(contact_id)}, {"username": 1, "avatar": 1})
+    if not contact:
+        return
+
+    viewed = await viewed_status_ids(db, owner_id, [str(s["_id"]) for s in statuses])
+    entries = [_feed_entry(s, str(s["_id"]) in viewed) for s in statuses]
+    await db.status_feeds.update_one(
+        {"owner_id": owner_id, "contact_id": contact_id},
+        {"$set": {"statuses": entries, **_contact_fields(contact, statuses[-1]["created_at"])}},
+        upsert=True
+    )
+
+
+async def remove_feed_entry(db, owner_id: str, contact_id: str):
+    """Forget a contact's statuses in the owner's feed"""
+    await db.status_feeds.delete_one({"owner_id": owner_id, "contact_id": contact_id})
+    status_feed_cache.pop(owner_id)
+
+
+async def get_status_feed(db, owner_id: str) -> dict:
+    """Contacts with live statuses, split into recent and viewed, from one feed read"""
+    cached = status_feed_cache.get(owner_id)
+    if cached is not None:
+        return cached
+
+    now = datetime.utcnow()
+    cutoff = status_cutoff(now)
+    docs = await db.status_feeds.find({
+        "owner_id": owner_id,
+        "expires_at": {"$gt": now}
+    }).sort("latest", -1).to_list(None)
+
+    result = {
+        "recent": [],
+        "viewed": []
+    }
+    # The cached feed changes when the oldest live status crosses the 24h boundary
+    next_expiry = None
+
+    for doc in docs:
+        live = [s for s in doc.get("statuses", []) if s["created_at"] >= cutoff]
+        if not live:
+            continue
+
+        oldest = min(s["created_at"] for s in live)
+        if next_expiry is None or oldest < next_expiry:
+            next_expiry = oldest
+
+        all_viewed = all(s.get("viewed") for s in live)
+        contact_data = {
+            "user_id": doc["contact_id"],
+            "username": doc.get("username", "Unknown"),
+            "avatar": doc.get("avatar"),
+            "status_count": len(live),
+            "latest_time": max(s["created_at"] for s in live).isoformat(),
+            "all_viewed": all_viewed
+        }
+
+        if all_viewed:
+            result["viewed"].append(contact_data)
+        else:
+            result["recent"].append(contact_data)
+
+    ttl = settings.STATUS_FEED_CACHE_TTL_SECONDS
+    if next_expiry is not None:
+        ttl = min(ttl, max(1, (next_expiry - cutoff).total_seconds()))
+    status_feed_cache.set(owner_id, result, ttl=ttl)
+
+    return result
@@ -0,0 +1,91 @@
+from datetime import datetime
+from typing import Iterable, List, Optional, Set
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from utils.pagination import Cursor, cursor_query, next_cursor
+
+# Mongo duplicate key error code
+DUPLICATE_KEY = 11000
+
+
+async def viewed_status_ids(db, viewer_id: str, status_ids: Iterable[str]) -> Set[str]:
+    """Which of the given statuses the viewer has already seen"""
+    views = await db.status_views.find(
+        {"viewer_id": viewer_id, "status_id": {"$in": list(status_ids)}},
+        {"status_id": 1}
+    ).to_list(None)
+    return {view["status_id"] for view in views}
+
+
+async def record_views(db, owner_id: str, viewer_id: str, status_ids: List[str]) -> List[str]:
+    """Write view ledger entries and bump counters, returning the ids newly recorded"""
+    if not status_ids:
+        return []
+
+    now = datetime.utcnow()
+    docs = [
+        {"status_id": status_id, "owner_id": owner_id, "viewer_id": viewer_id, "viewed_at": now}
+        for status_id in status_ids
+    ]
+
+    # A concurrent request may have recorded some of these already; the unique
+    # index rejects those and only the rest are counted
+    try:
+        await db.status_views.insert_many(docs, ordered=False)
+        recorded = list(status_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY for error in errors):
+            raise
+        failed = {error["index"] for error in errors}
+        recorded = [status_id for i, status_id in enumerate(status_ids) if i not in failed]
+
+    if recorded:
+        await db.statuses.update_many(
+            {"_id": {"$in": [ObjectId(status_id) for status_id in recorded]}},
+            {"$inc": {"view_count": 1}}
+        )
+
+    return recorded
+
+
+async def get_viewers(db, status_id: str, limit: int, before: Optional[Cursor]) -> dict:
+    """Page through a status' viewers, newest first"""
+    limit = max(1, min(limit, 100))
+    query = {"status_id": status_id}
+
+    if before:
+        query.update(cursor_query("viewed_at", before))
+
+    views = await db.status_views.find(query).sort([("viewed_at", -1), ("_id", -1)]).limit(limit).to_list(length=limit)
+
+    # Resolve all viewer profiles in one query
+    viewer_ids = [ObjectId(view["viewer_id"]) for view in views]
+    users = await db.users.find(
+        {"_id": {"$in": viewer_ids}},
+        {"username": 1, "avatar": 1}
+    ).to_list(length=len(viewer_ids))
+    users_by_id = {str(user["_id"]): user for user in users}
+
+    items = []
+    for view in views:
+        viewer = users_by_id.get(view["viewer_id"])
+        if not viewer:
+            continue
+        items.append({
+            "user_id": view["viewer_id"],
+            "username": viewer.get("username", "Unknown"),
+            "avatar": viewer.get("avatar"),
+            "viewed_at": view["viewed_at"].isoformat()
+        })
+
+    return {
+        "items": items,
+        "next_before": next_cursor(views, "viewed_at", limit)
+    }
+
+
+async def delete_views(db, status_ids: List[str]):
+    """Drop the ledger entries of deleted statuses"""
+    await db.status_views.delete_many({"status_id": {"$in": status_ids}})
@@ -0,0 +1,185 @@
+from typing import Optional
+from datetime import datetime
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+import hashlib
+
+from config import settings
+from services.blob_cache import blob_cache
+from services.thumbnails import delete_thumbnails
+from services.file_info import get_stored_file, invalidate_file_info
+
+
+class UploadTooLarge(Exception):
+    """Raised when an upload exceeds the configured size limit"""
+
+
+async def stream_upload(fs, source, filename: str, metadata: dict, max_size: Optional[int] = None) -> dict:
+    """
+    Stream an async readable source (e.g. UploadFile) into GridFS chunk by chunk,
+    enforcing the size limit incrementally and hashing the content on the fly.
+    Partial chunks are removed if the upload is aborted.
+    """
+    max_size = max_size or settings.MAX_FILE_SIZE
+    grid_in = fs.open_upload_stream(filename, metadata=metadata)
+    digest = hashlib.sha256()
+    size = 0
+
+    try:
+        while True:
+            chunk = await source.read(settings.UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(f"File exceeds maximum size of {max_size} bytes")
+
+            digest.update(chunk)
+            await grid_in.write(chunk)
+
+        # Size and hash are only known once the stream is consumed
+        await grid_in.set("metadata", {**metadata, "size": size, "sha256": digest.hexdigest()})
+        await grid_in.close()
+    except BaseException:
+        await grid_in.abort()
+        raise
+
+    return {
+        "file_id": grid_in._id,
+        "size": size,
+        "sha256": digest.hexdigest()
+    }
+
+
+async def dedupe_stored_file(db, fs, stored: dict) -> ObjectId:
+    """
+    Collapse a freshly stored upload onto an existing blob with the same content.
+
+    Every upload gets its own fs.files document (filename, uploader, thumbnails)
+    whose metadata.blob_id points at the shared content blob. Blobs are never
+    handed out; the content-hash index lists the uploads holding each one.
+    Returns the id of the upload's own document.
+    """
+    files = db["fs.files"]
+    upload = await files.find_one({"_id": stored["file_id"]})
+    upload_id = ObjectId()
+    entry = {
+        "_id": stored["sha256"],
+        "file_id": stored["file_id"],
+        "size": stored["size"],
+        "holders": [upload_id],
+        "refs": 1,
+        "created_at": datetime.utcnow()
+    }
+
+    while True:
+        try:
+            await db.file_hashes.insert_one(entry)
+            blob_id = stored["file_id"]
+            break
+        except DuplicateKeyError:
+            pass
+
+        existing = await db.file_hashes.find_one_and_update(
+            {"_id": stored["sha256"], "refs": {"$gt": 0}},
+            {"$push": {"holders": upload_id}, "$inc": {"refs": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if existing:
+            # Same content already stored - drop the duplicate blob
+            await fs.delete(stored["file_id"])
+            blob_id = existing["file_id"]
+            break
+
+        # Nobody holds the existing blob: it is being released, or a release
+        # crashed before removing the entry. Take the hash over so the loop
+        # can't spin on an entry that will never go away
+        stale = await db.file_hashes.find_one_and_replace({"_id": stored["sha256"], "refs": {"$lte": 0}}, entry)
+        if stale:
+            if stale["file_id"] != stored["file_id"]:
+                await _delete_blob(db, fs, stale["file_id"])
+            blob_id = stored["file_id"]
+            break
+        # The entry was removed meanwhile; try to claim the hash again
+
+    await files.insert_one({
+        **upload,
+        "_id": upload_id,
+        "metadata": {**(upload.get("metadata") or {}), "blob_id": blob_id}
+    })
+
+    if blob_id == stored["file_id"]:
+        # The stored file becomes the shared blob and keeps no per-upload details
+        await files.update_one({"_id": blob_id}, {"$set": {
+            "filename": stored["sha256"],
+            "metadata": {"blob": True, "size": stored["size"], "sha256": stored["sha256"]}
+        }})
+
+    return upload_id
+
+
+async def _delete_blob(db, fs, blob_id: ObjectId):
+    blob_cache.invalidate(str(blob_id))
+    try:
+        await fs.delete(blob_id)
+    except Exception:
+        pass  # Blob already gone
+
+
+async def release_file(db, fs, file_id: ObjectId) -> bool:
+    """
+    Delete an upload, dropping its hold on the shared blob and deleting the
+    blob once no upload holds it. Returns False if the upload does not exist,
+    so releasing the same upload twice only counts once.
+    """
+    file_doc = await get_stored_file(db, file_id)
+    if file_doc is None:
+        return False
+    blob_id = (file_doc.get("metadata") or {}).get("blob_id")
+
+    if blob_id is None:
+        return await _release_unshared(db, fs, file_id)
+
+    # Removing the upload's own document is what makes the release count once
+    deleted = await db["fs.files"].delete_one({"_id": file_id})
+    if not deleted.deleted_count:
+        return False
+    invalidate_file_info(file_id)
+    await delete_thumbnails(db, fs, file_id)
+
+    entry = await db.file_hashes.find_one_and_update(
+        {"file_id": blob_id, "holders": file_id},
+        {"$pull": {"holders": file_id}, "$inc": {"refs": -1}},
+        return_document=ReturnDocument.AFTER
+    )
+    if entry is None or entry["refs"] > 0:
+        return True
+
+    # Last holder - only delete if no upload re-claimed it meanwhile
+    result = await db.file_hashes.delete_one({"_id": entry["_id"], "refs": {"$lte": 0}})
+    if result.deleted_count:
+        await _delete_blob(db, fs, blob_id)
+    return True
+
+
+async def _release_unshared(db, fs, file_id: ObjectId) -> bool:
+    """Files stored before per-upload documents, which hold their own content"""
+    entry = await db.file_hashes.find_one({"file_id": file_id, "holders": {"$exists": False}})
+    if entry is not None and entry["refs"] > 1:
+        # Shared under one id before holders were tracked: which references are
+        # gone can't be told apart, so the content is kept rather than risk
+        # deleting it from under another user
+        return True
+    if entry is not None:
+        await db.file_hashes.delete_one({"_id": entry["_id"]})
+
+    invalidate_file_info(file_id)
+    try:
+        await fs.delete(file_id)
+    except Exception:
+        return False
+    blob_cache.invalidate(str(file_id))
+    await delete_thumbnails(db, fs, file_id)
+    return True
@@ -0,0 +1,169 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Set
+from bson import ObjectId
+import asyncio
+import base64
+import io
+
+from config import settings
+from utils.db import get_db, get_fs
+from services.jobs import job_queue
+from services.websocket import manager
+from services.file_info import get_file_infos, invalidate_file_info, open_content
+
+try:
+    from PIL import Image, ImageFilter, ImageOps
+except ImportError:  # Pillow is optional - uploads simply get no thumbnails
+    Image = None
+
+# Longest side in pixels for each thumbnail size
+THUMBNAIL_SIZES = {"small": 160, "medium": 480}
+# Longest side of the blurred inline placeholder
+PLACEHOLDER_SIZE = 16
+
+_pool: Optional[ProcessPoolExecutor] = None
+_decodable_types: Optional[Set[str]] = None
+
+
+def render_thumbnails(data: bytes) -> dict:
+    """Downscale an image into JPEG thumbnails and a blur placeholder (runs in a worker process)"""
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    thumbnails = {}
+    for name, max_side in THUMBNAIL_SIZES.items():
+        thumb = image.copy()
+        thumb.thumbnail((max_side, max_side))
+        out = io.BytesIO()
+        thumb.save(out, "JPEG", quality=80, optimize=True)
+        thumbnails[name] = out.getvalue()
+
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+    tiny = tiny.filter(ImageFilter.GaussianBlur(1))
+    out = io.BytesIO()
+    tiny.save(out, "JPEG", quality=40)
+    placeholder = "data:image/jpeg;base64," + base64.b64encode(out.getvalue()).decode()
+
+    return {"thumbnails": thumbnails, "placeholder": placeholder}
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.THUMBNAIL_WORKERS)
+    return _pool
+
+
+def shutdown_pool():
+    """Stop the thumbnail worker processes"""
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def can_thumbnail(content_type: str, size: int) -> bool:
+    """Images Pillow can decode (not e.g. SVG) and small enough to load in memory"""
+    global _decodable_types
+    if Image is None or size > settings.THUMBNAIL_MAX_SOURCE_BYTES:
+        return False
+    if _decodable_types is None:
+        Image.init()
+        _decodable_types = {
+            mime for fmt, mime in Image.MIME.items()
+            if fmt in Image.OPEN and mime.startswith("image/")
+        }
+    return content_type in _decodable_types
+
+
+async def enqueue_thumbnails(file_id: ObjectId, content_type: str, size: int, owner_id: str = None):
+    """Queue thumbnail generation for an uploaded image"""
+    if not can_thumbnail(content_type, size):
+        return None
+    return await job_queue.enqueue("generate_thumbnails", {"file_id": str(file_id)}, owner_id=owner_id)
+
+
+async def generate_thumbnails(job: dict, report):
+    """Job handler: store thumbnails as linked GridFS files and record them on the original"""
+    db = get_db()
+    fs = get_fs()
+    file_id = ObjectId(job["params"]["file_id"])
+
+    file_doc = await db.fs.files.find_one({"_id": file_id})
+    if not file_doc:
+        return
+    metadata = file_doc.get("metadata") or {}
+    if metadata.get("thumbnails"):
+        # Already generated (e.g. a retried job)
+        return
+
+    # The whole image is read and sent to a worker process, so re-check the cap
+    if not can_thumbnail(metadata.get("content_type", ""), file_doc.get("length", 0)):
+        return
+
+    await report(0, 1)
+    grid_out = await open_content(fs, file_doc)
+    data = await grid_out.read()
+
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(get_pool(), render_thumbnails, data)
+
+    thumbnails = {}
+    for name, content in rendered["thumbnails"].items():
+        thumb_id = await fs.upload_from_stream(
+            f"{name}_{metadata.get('original_filename', 'image')}.jpg",
+            content,
+            metadata={
+                "content_type": "image/jpeg",
+                "original_filename": f"{name}_{metadata.get('original_filename', 'image')}.jpg",
+                "size": len(content),
+                "thumbnail_of": str(file_id),
+                "thumbnail_size": name
+            }
+        )
+        thumbnails[name] = str(thumb_id)
+
+    result = await db.fs.files.update_one(
+        {"_id": file_id},
+        {"$set": {"metadata.thumbnails": thumbnails, "metadata.placeholder": rendered["placeholder"]}}
+    )
+    if not result.matched_count:
+        # The original was deleted while rendering; nothing will clean these up later
+        await delete_thumbnails(db, fs, file_id)
+        return
+    invalidate_file_info(file_id)
+    await report(1, 1)
+
+    if job.get("owner_id"):
+        await manager.send_personal(job["owner_id"], {
+            "type": "file_thumbnails",
+            "file_id": str(file_id),
+            "thumbnails": thumbnails,
+            "placeholder": rendered["placeholder"]
+        })
+
+
+async def delete_thumbnails(db, fs, file_id: ObjectId):
+    """Delete the thumbnails linked to a removed file"""
+    linked = await db.fs.files.find({"metadata.thumbnail_of": str(file_id)}, {"_id": 1}).to_list(length=None)
+    for thumb in linked:
+        try:
+            await fs.delete(thumb["_id"])
+        except Exception:
+            pass
+
+
+async def resolve_file_previews(db, file_ids: Iterable[Optional[str]]) -> Dict[str, dict]:
+    """Thumbnail ids and placeholders for a page of file messages"""
+    infos = await get_file_infos(db, file_ids)
+    return {
+        file_id: {"thumbnails": info["thumbnails"], "placeholder": info["placeholder"]}
+        for file_id, info in infos.items()
+        if info.get("thumbnails")
+    }
+
+
+# Own workers, sized like the process pool, so bulk deletes can't delay thumbnails
+job_queue.add_queue("thumbnails", settings.THUMBNAIL_WORKERS)
+job_queue.register("generate_thumbnails", generate_thumbnails, queue="thumbnails")
@@ -0,0 +1,218 @@
+from typing import AsyncIterator, List, Optional
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ReturnDocument
+import hashlib
+
+from config import settings
+from utils.db import get_db
+
+# Session lifecycle: open -> finalizing -> (removed once the file is stored)
+SESSION_OPEN = "open"
+SESSION_FINALIZING = "finalizing"
+
+
+class UploadSessionError(Exception):
+    """Raised for invalid chunk offsets, sizes or incomplete uploads"""
+
+
+def session_expiry() -> datetime:
+    return datetime.utcnow() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+
+async def create_session(user_id: str, filename: str, size: int, content_type: str) -> dict:
+    """Reserve a GridFS file id and persist a resumable upload session"""
+    now = datetime.utcnow()
+    chunk_size = settings.UPLOAD_CHUNK_SIZE
+    session = {
+        "file_id": ObjectId(),
+        "user_id": user_id,
+        "filename": filename,
+        "content_type": content_type,
+        "size": size,
+        "chunk_size": chunk_size,
+        "total_chunks": -(-size // chunk_size),  # ceil division
+        "status": SESSION_OPEN,
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": session_expiry()
+    }
+    await get_db().upload_sessions.insert_one(session)
+    return session
+
+
+async def get_session(upload_id: str, user_id: str) -> Optional[dict]:
+    if not ObjectId.is_valid(upload_id):
+        return None
+    return await get_db().upload_sessions.find_one({"_id": ObjectId(upload_id), "user_id": user_id})
+
+
+async def write_chunks(session: dict, offset: int, body: AsyncIterator[bytes]) -> int:
+    """
+    Write a request body starting at offset straight into GridFS chunk documents.
+    Offsets must be chunk-aligned; each chunk is upserted so retries are idempotent
+    and different ranges can be uploaded in parallel. Returns bytes written.
+    """
+    chunk_size = session["chunk_size"]
+    size = session["size"]
+
+    if offset < 0 or offset % chunk_size != 0 or offset >= max(size, 1):
+        raise UploadSessionError(f"Offset must be a multiple of {chunk_size} within the file")
+
+    db = get_db()
+
+    # Register the write against the stored session: the caller's copy may be
+    # stale, and a session being finalized must not take chunks mid-hash
+    registered = await db.upload_sessions.find_one_and_update(
+        {"_id": session["_id"], "status": SESSION_OPEN},
+        {"$inc": {"active_writes": 1}}
+    )
+    if not registered:
+        raise UploadSessionError("Upload is no longer accepting chunks")
+
+    try:
+        return await _write_body(db, session, offset, body)
+    finally:
+        await db.upload_sessions.update_one({"_id": session["_id"]}, {"$inc": {"active_writes": -1}})
+
+
+async def _write_body(db, session: dict, offset: int, body: AsyncIterator[bytes]) -> int:
+    chunk_size = session["chunk_size"]
+    size = session["size"]
+    n = offset // chunk_size
+    buffer = bytearray()
+    written = 0
+
+    async def flush(data: bytes):
+        nonlocal n, written
+        await db["fs.chunks"].update_one(
+            {"files_id": session["file_id"], "n": n},
+            {"$set": {"data": bytes(data)}},
+            upsert=True
+        )
+        n += 1
+        written += len(data)
+
+    async for data in body:
+        buffer.extend(data)
+        if offset + written + len(buffer) > size:
+            raise UploadSessionError("Chunk extends past the declared file size")
+        while len(buffer) >= chunk_size:
+            await flush(buffer[:chunk_size])
+            del buffer[:chunk_size]
+
+    if buffer:
+        # Only the final chunk of the file may be short
+        if offset + written + len(buffer) != size:
+            raise UploadSessionError(f"Chunks must be {chunk_size} bytes except the last one")
+        await flush(buffer)
+
+    await db.upload_sessions.update_one(
+        {"_id": session["_id"]},
+        {"$set": {"updated_at": datetime.utcnow(), "expires_at": session_expiry()}}
+    )
+    return written
+
+
+async def received_chunks(session: dict) -> List[int]:
+    """Chunk numbers already stored for a session"""
+    chunks = await get_db()["fs.chunks"].find(
+        {"files_id": session["file_id"]},
+        {"n": 1, "_id": 0}
+    ).sort("n", 1).to_list(length=None)
+    return [chunk["n"] for chunk in chunks]
+
+
+def committed_offset(session: dict, chunks: List[int]) -> int:
+    """Bytes uploaded contiguously from the start of the file"""
+    contiguous = 0
+    for n in chunks:
+        if n != contiguous:
+            break
+        contiguous += 1
+    return min(contiguous * session["chunk_size"], session["size"])
+
+
+async def finalize_session(session: dict) -> dict:
+    """Verify all chunks, hash the content and publish the GridFS file"""
+    db = get_db()
+
+    # Claim the session so concurrent finalize calls don't both publish it;
+    # chunk writes still in flight have to finish first
+    claimed = await db.upload_sessions.find_one_and_update(
+        {"_id": session["_id"], "status": SESSION_OPEN, "active_writes": {"$in": [0, None]}},
+        {"$set": {"status": SESSION_FINALIZING, "updated_at": datetime.utcnow()}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not claimed:
+        raise UploadSessionError("Upload is already being finalized or still receiving chunks")
+
+    try:
+        chunks = await received_chunks(session)
+        if chunks != list(range(session["total_chunks"])):
+            raise UploadSessionError(f"Upload incomplete: {len(chunks)}/{session['total_chunks']} chunks received")
+
+        digest = hashlib.sha256()
+        length = 0
+        cursor = db["fs.chunks"].find({"files_id": session["file_id"]}).sort("n", 1)
+        async for chunk in cursor:
+            digest.update(chunk["data"])
+            length += len(chunk["data"])
+
+        if length != session["size"]:
+            raise UploadSessionError(f"Upload size mismatch: expected {session['size']} bytes, got {length}")
+    except BaseException:
+        # Reopen so the client can resume (or the session expires normally)
+        await db.upload_sessions.update_one({"_id": session["_id"]}, {"$set": {"status": SESSION_OPEN}})
+        raise
+
+    await db["fs.files"].insert_one({
+        "_id": session["file_id"],
+        "length": length,
+        "chunkSize": session["chunk_size"],
+        "uploadDate": datetime.utcnow(),
+        "filename": session["filename"],
+        "metadata": {
+            "content_type": session["content_type"],
+            "uploaded_by": session["user_id"],
+            "original_filename": session["filename"],
+            "size": length,
+            "sha256": digest.hexdigest()
+        }
+    })
+    await db.upload_sessions.delete_one({"_id": session["_id"]})
+
+    return {"file_id": session["file_id"], "size": length, "sha256": digest.hexdigest()}
+
+
+async def reset_interrupted_writes():
+    """Chunk writes cut off by a restart no longer block finalizing their session"""
+    await get_db().upload_sessions.update_many(
+        {"active_writes": {"$gt": 0}},
+        {"$set": {"active_writes": 0}}
+    )
+
+
+async def abort_session(session: dict):
+    """Discard a session and its stored chunks"""
+    db = get_db()
+    await db["fs.chunks"].delete_many({"files_id": session["file_id"]})
+    await db.upload_sessions.delete_one({"_id": session["_id"]})
+
+
+async def expire_abandoned_sessions():
+    """
+    Remove sessions (and partial chunks) with no activity within the TTL.
+    Sessions left finalizing by a crashed server are swept once stuck that long too.
+    """
+    db = get_db()
+    now = datetime.utcnow()
+    expired = await db.upload_sessions.find({"$or": [
+        {"status": SESSION_OPEN, "expires_at": {"$lt": now}},
+        {"status": SESSION_FINALIZING, "updated_at": {"$lt": now - timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)}}
+    ]}).to_list(length=None)
+    for session in expired:
+        if session["status"] == SESSION_FINALIZING:
+            # The file may have been published without being handed to the client
+            await db["fs.files"].delete_one({"_id": session["file_id"], "metadata.blob": {"$ne": True}})
+        await abort_session(session)
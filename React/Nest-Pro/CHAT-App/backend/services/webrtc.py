@@ -1,6 +1,13 @@
-from typing import Dict, Set, Optional
-from datetime import datetime
+from typing import Dict, List, Set, Optional, Tuple
+from datetime import datetime, timedelta
+import asyncio
 import json
+import time
+
+from config import settings
+from services.metrics import metrics
+from services.websocket import manager
+from services.call_log import STATUS_BY_REASON, record_call_safely
 
 class CallManager:
     """Manages WebRTC signaling for audio/video calls"""
@@ -14,17 +21,23 @@ class CallManager:
         self.group_calls: Dict[str, Set[str]] = {}
     
     def create_call(self, call_id: str, caller_id: str, callee_id: str = None, 
-                   room_id: str = None, call_type: str = "audio") -> dict:
+                   room_id: str = None, call_type: str = "audio", caller_name: str = None) -> dict:
         """Create a new call"""
         call = {
             "call_id": call_id,
             "caller_id": caller_id,
+            "caller_name": caller_name,
             "callee_id": callee_id,
             "room_id": room_id,
             "call_type": call_type,  # audio, video
             "status": "ringing",  # ringing, active, ended
             "started_at": datetime.utcnow().isoformat(),
-            "participants": {caller_id}
+            "answered_at": None,
+            # Monotonic clock, for ring timeouts
+            "rang_at": time.monotonic(),
+            "participants": {caller_id},
+            # Everyone who was ever in the call, for the history record
+            "joined": {caller_id}
         }
         
         self.active_calls[call_id] = call
@@ -42,7 +55,10 @@ class CallManager:
         
         call = self.active_calls[call_id]
         call["participants"].add(user_id)
+        call["joined"].add(user_id)
         call["status"] = "active"
+        if not call["answered_at"]:
+            call["answered_at"] = datetime.utcnow().isoformat()
         
         self.user_calls[user_id] = call_id
         
@@ -75,13 +91,14 @@ class CallManager:
         
         return call
     
-    def end_call(self, call_id: str) -> Optional[dict]:
+    def end_call(self, call_id: str, reason: str = "ended") -> Optional[dict]:
         """End a call"""
         if call_id not in self.active_calls:
             return None
         
         call = self.active_calls[call_id]
         call["status"] = "ended"
+        call["reason"] = reason  # ended, declined, missed, disconnected
         call["ended_at"] = datetime.utcnow().isoformat()
         
         # Clean up user mappings
@@ -115,12 +132,117 @@ class CallManager:
     def is_user_in_call(self, user_id: str) -> bool:
         """Check if user is in a call"""
         return user_id in self.user_calls
+    
+    def calls_involving(self, user_id: str) -> List[str]:
+        """Call IDs the user is in or is being rung for"""
+        return [
+            call_id for call_id, call in self.active_calls.items()
+            if user_id in call["participants"] or call.get("callee_id") == user_id
+        ]
+    
+    def expired_ringing(self, timeout: float) -> List[str]:
+        """Call IDs that have been ringing for longer than timeout seconds"""
+        deadline = time.monotonic() - timeout
+        return [
+            call_id for call_id, call in self.active_calls.items()
+            if call["status"] == "ringing" and call["rang_at"] < deadline
+        ]
+    
+    def count_by_status(self, status: str) -> int:
+        return sum(1 for call in self.active_calls.values() if call["status"] == status)
 
 
 # Global call manager instance
 call_manager = CallManager()
 
 
+class IceBatcher:
+    """
+    Coalesces trickled ICE candidates per (call, sender, receiver) into one
+    frame per window instead of relaying every candidate on its own.
+    """
+    
+    def __init__(self, window_seconds: float):
+        self.window = window_seconds
+        # (call_id, sender, receiver) -> {"frame", "candidates", "stats"}
+        self.pending: Dict[Tuple[str, str, str], dict] = {}
+        self.timers: Dict[Tuple[str, str, str], asyncio.Task] = {}
+    
+    async def add(self, key: Tuple[str, str, str], frame: dict, candidate: Optional[dict],
+                  stats: dict, end_of_candidates: bool = False):
+        """
+        Queue a candidate for the receiver in key. frame holds the fields of the
+        outgoing message and stats (the call dict) collects per-call counters.
+        """
+        entry = self.pending.setdefault(key, {"frame": frame, "candidates": [], "stats": stats})
+        if candidate is not None:
+            entry["candidates"].append(candidate)
+            # Without batching every candidate was a frame of its own
+            stats["ice_candidates"] = stats.get("ice_candidates", 0) + 1
+            metrics.inc("ice.candidates")
+        
+        if end_of_candidates:
+            timer = self.timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            await self.flush(key, end_of_candidates=True)
+        elif key not in self.timers:
+            self.timers[key] = asyncio.create_task(self._flush_later(key))
+    
+    async def _flush_later(self, key: Tuple[str, str, str]):
+        await asyncio.sleep(self.window)
+        self.timers.pop(key, None)
+        await self.flush(key)
+    
+    async def flush(self, key: Tuple[str, str, str], end_of_candidates: bool = False):
+        """Send everything buffered for key as one frame"""
+        entry = self.pending.pop(key, None)
+        if not entry or not (entry["candidates"] or end_of_candidates):
+            return
+        
+        stats = entry["stats"]
+        stats["ice_frames"] = stats.get("ice_frames", 0) + 1
+        metrics.inc("ice.frames")
+        
+        await relay(key[2], {
+            **entry["frame"],
+            "candidates": entry["candidates"],
+            "end_of_candidates": end_of_candidates,
+            "timestamp": datetime.utcnow().isoformat()
+        })
+    
+    def discard(self, call_id: str):
+        """Drop anything still buffered for an ended call"""
+        for key in [key for key in self.pending if key[0] == call_id]:
+            timer = self.timers.pop(key, None)
+            if timer:
+                timer.cancel()
+            del self.pending[key]
+
+
+ice_batcher = IceBatcher(settings.ICE_BATCH_WINDOW_MS / 1000)
+
+
+# Call setup telemetry (milliseconds)
+def elapsed_ms(since: float) -> float:
+    """Milliseconds since a time.monotonic() reading"""
+    return (time.monotonic() - since) * 1000
+
+
+def observe_setup(call: dict, stage: str):
+    """Record how long after the offer a setup stage was first reached"""
+    if stage not in call.setdefault("setup_ms", {}):
+        call["setup_ms"][stage] = elapsed_ms(call["rang_at"])
+        metrics.observe(f"calls.{stage}_ms", call["setup_ms"][stage])
+
+
+async def relay(user_id: str, message: dict, metric: str = "signaling.relay_ms"):
+    """send_personal for signaling frames, recording how long delivery took"""
+    started = time.monotonic()
+    await manager.send_personal(user_id, message)
+    metrics.observe(metric, elapsed_ms(started))
+
+
 # WebRTC signaling helpers
 def create_offer_message(call_id: str, caller_id: str, caller_name: str, sdp: str, call_type: str) -> dict:
     """Create WebRTC offer message"""
@@ -146,22 +268,137 @@ def create_answer_message(call_id: str, answerer_id: str, sdp: str) -> dict:
     }
 
 
-def create_ice_candidate_message(call_id: str, user_id: str, candidate: dict) -> dict:
-    """Create ICE candidate message"""
+def create_ice_candidates_message(call_id: str, user_id: str) -> dict:
+    """Create ICE candidates message; the batcher fills in the candidates"""
     return {
-        "type": "ice_candidate",
+        "type": "ice_candidates",
         "call_id": call_id,
-        "user_id": user_id,
-        "candidate": candidate,
-        "timestamp": datetime.utcnow().isoformat()
+        "user_id": user_id
     }
 
 
-def create_call_ended_message(call_id: str, ended_by: str) -> dict:
+def create_call_ended_message(call_id: str, ended_by: Optional[str], reason: str = "ended") -> dict:
     """Create call ended message"""
     return {
         "type": "call_ended",
         "call_id": call_id,
         "ended_by": ended_by,
+        "reason": reason,
         "timestamp": datetime.utcnow().isoformat()
     }
+
+
+def create_missed_call_message(call: dict) -> dict:
+    """Create missed call notification for the callee"""
+    return {
+        "type": "missed_call",
+        "call_id": call["call_id"],
+        "caller_id": call["caller_id"],
+        "caller_name": call.get("caller_name"),
+        "call_type": call["call_type"],
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+# Call lifecycle
+async def finish_call(call_id: str, ended_by: Optional[str], reason: str = "ended") -> Optional[dict]:
+    """
+    End a call and tell everyone else involved. A call that was never answered
+    ends as declined (by the callee) or missed (cancelled, timed out or dropped).
+    """
+    call = call_manager.get_call(call_id)
+    if not call:
+        return None
+    
+    if call["status"] == "ringing":
+        declined = reason == "ended" and ended_by and ended_by == call.get("callee_id")
+        reason = "declined" if declined else "missed"
+    
+    recipients = set(call["participants"])
+    if call.get("callee_id"):
+        recipients.add(call["callee_id"])
+    recipients.discard(ended_by)
+    
+    call = call_manager.end_call(call_id, reason)
+    metrics.inc(f"calls.{reason}")
+    
+    ice_batcher.discard(call_id)
+    metrics.observe("calls.ice_frames", call.get("ice_frames", 0))
+    metrics.observe("calls.ice_frames_unbatched", call.get("ice_candidates", 0))
+    
+    end_message = create_call_ended_message(call_id, ended_by, reason)
+    for user_id in recipients:
+        await manager.send_personal(user_id, end_message)
+    
+    if reason == "missed" and call.get("callee_id"):
+        await manager.send_personal(call["callee_id"], create_missed_call_message(call))
+    
+    await log_call(call)
+    
+    return call
+
+
+async def log_call(call: dict):
+    """Write the server-side history record for an ended call"""
+    status = STATUS_BY_REASON.get(call["reason"], "completed")
+    
+    if call.get("callee_id"):
+        rung = {call["callee_id"]}
+    else:
+        rung = set(manager.room_members.get(call.get("room_id"), set()))
+    missed_by = set() if status == "rejected" else rung - call["joined"]
+    
+    await record_call_safely(
+        call_id=call["call_id"],
+        caller_id=call["caller_id"],
+        caller_name=call.get("caller_name"),
+        callee_id=call.get("callee_id"),
+        room_id=call.get("room_id"),
+        call_type=call["call_type"],
+        status=status,
+        started_at=datetime.fromisoformat(call["started_at"]),
+        answered_at=datetime.fromisoformat(call["answered_at"]) if call["answered_at"] else None,
+        ended_at=datetime.fromisoformat(call["ended_at"]),
+        participants=call["joined"],
+        missed_by=missed_by
+    )
+
+
+async def end_calls_for_user(user_id: str):
+    """Disconnect hook: end calls the user was in or being rung for once they go offline"""
+    for call_id in call_manager.calls_involving(user_id):
+        await finish_call(call_id, user_id, reason="disconnected")
+
+
+async def reap_stale_calls():
+    """Time out unanswered calls and drop calls nobody online is left in"""
+    for call_id in call_manager.expired_ringing(settings.CALL_RING_TIMEOUT_SECONDS):
+        await finish_call(call_id, None)
+    
+    for call_id, call in list(call_manager.active_calls.items()):
+        if not any(manager.is_online(user_id) for user_id in call["participants"]):
+            metrics.inc("calls.reaped")
+            await finish_call(call_id, None, reason="disconnected")
+    
+    # A group call nobody answered would otherwise block new calls in the room
+    ring_cutoff = datetime.utcnow() - timedelta(seconds=settings.CALL_RING_TIMEOUT_SECONDS)
+    for room_id, call in list(manager.active_group_calls.items()):
+        if not call["answered_at"] and datetime.fromisoformat(call["started_at"]) < ring_cutoff:
+            metrics.inc("group_calls.missed")
+            await manager.end_group_call(room_id, reason="missed")
+            continue
+        
+        for user_id in list(call["participants"]):
+            if not manager.is_online(user_id):
+                metrics.inc("group_calls.reaped_participants")
+                await manager.leave_group_call(room_id, user_id)
+
+
+manager.on_disconnect(end_calls_for_user)
+
+metrics.gauge("calls.active", lambda: call_manager.count_by_status("active"))
+metrics.gauge("calls.ringing", lambda: call_manager.count_by_status("ringing"))
+metrics.gauge("group_calls.active", lambda: len(manager.active_group_calls))
+metrics.gauge("group_calls.participants", lambda: sum(
+    len(call["participants"]) for call in manager.active_group_calls.values()
+))
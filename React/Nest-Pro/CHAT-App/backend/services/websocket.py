@@ -1,7 +1,12 @@
-from typing import Dict, List, Set
+from typing import Awaitable, Callable, Dict, List, Optional, Set
 from datetime import datetime
+import asyncio
 import json
 
+from config import settings
+from services.metrics import metrics
+from services.call_log import record_call_safely
+
 class ConnectionManager:
     """Manages WebSocket connections for real-time messaging"""
     
@@ -14,7 +19,8 @@ class ConnectionManager:
         self.user_status: Dict[str, str] = {}
         # Group call tracking: room_id -> {call_id, initiator, participants: set, call_type}
         self.active_group_calls: Dict[str, dict] = {}
-
+        # Coroutines run with the user_id when a user's last connection closes
+        self.disconnect_hooks: List[Callable[[str], Awaitable[None]]] = []
     
     async def connect(self, websocket, user_id: str):
         """Accept and store new connection"""
@@ -40,6 +46,23 @@ class ConnectionManager:
                 del self.active_connections[user_id]
                 self.user_status[user_id] = "offline"
                 await self.broadcast_status(user_id, "offline")
+                await self.release_user(user_id)
+    
+    def on_disconnect(self, hook: Callable[[str], Awaitable[None]]):
+        """Register a coroutine to run when a user goes offline"""
+        self.disconnect_hooks.append(hook)
+    
+    async def release_user(self, user_id: str):
+        """Drop an offline user from group calls and run disconnect hooks"""
+        for room_id, call in list(self.active_group_calls.items()):
+            if user_id in call["participants"]:
+                await self.leave_group_call(room_id, user_id)
+        
+        for hook in self.disconnect_hooks:
+            try:
+                await hook(user_id)
+            except Exception as e:
+                print(f"⚠️ Disconnect hook failed for {user_id}: {e}")
     
     async def send_personal(self, user_id: str, message: dict):
         """Send message to a specific user"""
@@ -93,33 +116,47 @@ class ConnectionManager:
         return list(self.active_connections.keys())
     
     # Group Call Methods
-    async def start_group_call(self, room_id: str, initiator_id: str, initiator_name: str, call_type: str, call_id: str):
-        """Start a group call and notify all online room members"""
+    async def start_group_call(self, room_id: str, initiator_id: str, initiator_name: str, call_type: str, call_id: str,
+                               ring: Optional[List[str]] = None):
+        """Start a group call and notify online room members (or the given ring list)"""
         import uuid
         if not call_id:
             call_id = str(uuid.uuid4())
         
+        if ring is None:
+            ring = [
+                user_id for user_id in self.room_members.get(room_id, set())
+                if user_id != initiator_id and self.is_online(user_id)
+            ]
+        
         self.active_group_calls[room_id] = {
             "call_id": call_id,
             "initiator_id": initiator_id,
             "initiator_name": initiator_name,
             "call_type": call_type,
             "participants": {initiator_id},
-            "started_at": datetime.utcnow().isoformat()
+            "started_at": datetime.utcnow().isoformat(),
+            "answered_at": None,
+            # For the history record: everyone who joined / was notified
+            "joined": {initiator_id},
+            "rung": set(ring)
         }
         
-        # Notify all online room members
-        if room_id in self.room_members:
-            for user_id in self.room_members[room_id]:
-                if user_id != initiator_id and self.is_online(user_id):
-                    await self.send_personal(user_id, {
-                        "type": "group_call_incoming",
-                        "room_id": room_id,
-                        "call_id": call_id,
-                        "initiator_id": initiator_id,
-                        "initiator_name": initiator_name,
-                        "call_type": call_type
-                    })
+        incoming = {
+            "type": "group_call_incoming",
+            "room_id": room_id,
+            "call_id": call_id,
+            "initiator_id": initiator_id,
+            "initiator_name": initiator_name,
+            "call_type": call_type
+        }
+        
+        # Ring in bounded concurrent batches so large rooms don't stall the sender
+        batch_size = settings.GROUP_CALL_RING_BATCH_SIZE
+        for i in range(0, len(ring), batch_size):
+            await asyncio.gather(*(
+                self.send_personal(user_id, incoming) for user_id in ring[i:i + batch_size]
+            ))
         
         return call_id
     
@@ -128,6 +165,9 @@ class ConnectionManager:
         if room_id in self.active_group_calls:
             call = self.active_group_calls[room_id]
             call["participants"].add(user_id)
+            call["joined"].add(user_id)
+            if not call["answered_at"] and user_id != call["initiator_id"]:
+                call["answered_at"] = datetime.utcnow().isoformat()
             
             # Notify all existing participants
             for participant_id in call["participants"]:
@@ -153,6 +193,7 @@ class ConnectionManager:
             # If no participants left, end the call
             if len(call["participants"]) == 0:
                 del self.active_group_calls[room_id]
+                await self.close_group_call(room_id, call)
                 return None
             
             # Notify remaining participants
@@ -168,6 +209,49 @@ class ConnectionManager:
             return call
         return None
     
+    async def end_group_call(self, room_id: str, reason: str = "ended"):
+        """End a room's call for everyone still in it or being rung"""
+        call = self.active_group_calls.pop(room_id, None)
+        if not call:
+            return None
+        
+        await self.close_group_call(room_id, call)
+        
+        ended = {
+            "type": "group_call_ended",
+            "room_id": room_id,
+            "call_id": call["call_id"],
+            "reason": reason
+        }
+        for user_id in call["participants"] | call["rung"]:
+            await self.send_personal(user_id, ended)
+        
+        return call
+    
+    async def close_group_call(self, room_id: str, call: dict):
+        """Report and log a group call that was just removed"""
+        metrics.observe("group_calls.ice_frames", call.get("ice_frames", 0))
+        metrics.observe("group_calls.ice_frames_unbatched", call.get("ice_candidates", 0))
+        metrics.observe("group_calls.signaling_messages", sum(call.get("signaling", {}).values()))
+        await self.log_group_call(room_id, call)
+    
+    async def log_group_call(self, room_id: str, call: dict):
+        """Write the server-side history record for an ended group call"""
+        answered_at = call["answered_at"]
+        await record_call_safely(
+            call_id=call["call_id"],
+            caller_id=call["initiator_id"],
+            caller_name=call["initiator_name"],
+            room_id=room_id,
+            call_type=call["call_type"],
+            status="completed" if answered_at else "missed",
+            started_at=datetime.fromisoformat(call["started_at"]),
+            answered_at=datetime.fromisoformat(answered_at) if answered_at else None,
+            ended_at=datetime.utcnow(),
+            participants=call["joined"],
+            missed_by=call["rung"] - call["joined"]
+        )
+    
     def get_group_call(self, room_id: str):
         """Get active group call for a room"""
         return self.active_group_calls.get(room_id)
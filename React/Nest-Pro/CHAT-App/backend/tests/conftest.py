@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Tests import the app's modules (config, routes, services) from the backend root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
@@ -0,0 +1,90 @@
+"""Smoke tests for GET /api/files/{id}: full, single-range and multi-range responses"""
+from datetime import datetime
+import asyncio
+
+from bson import ObjectId
+from starlette.requests import Request
+
+import routes.files as files
+
+CONTENT = b"0123456789abcdefghij"
+
+
+class FakeGridOut:
+    def __init__(self, data: bytes):
+        self.data = data
+        self.length = len(data)
+        self.upload_date = datetime(2024, 1, 1)
+        self.position = 0
+
+    def seek(self, position: int):
+        self.position = position
+
+    async def read(self, size: int) -> bytes:
+        chunk = self.data[self.position:self.position + size]
+        self.position += len(chunk)
+        return chunk
+
+
+class FakeFS:
+    async def open_download_stream(self, file_id):
+        return FakeGridOut(CONTENT)
+
+
+def download(monkeypatch, headers: dict):
+    file_id = ObjectId()
+    file_doc = {
+        "_id": file_id,
+        "uploadDate": datetime(2024, 1, 1),
+        "metadata": {"content_type": "text/plain", "original_filename": "a.txt", "sha256": "abc"}
+    }
+
+    async def get_stored_file(db, requested_id):
+        return file_doc
+
+    monkeypatch.setattr(files, "get_fs", lambda: FakeFS())
+    monkeypatch.setattr(files, "get_db", lambda: None)
+    monkeypatch.setattr(files, "get_stored_file", get_stored_file)
+    monkeypatch.setattr(files.blob_cache, "max_bytes", 0)
+    monkeypatch.setattr(files.blob_cache, "schedule_fill", lambda blob_id, size: None)
+
+    request = Request({
+        "type": "http",
+        "method": "GET",
+        "headers": [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+    })
+
+    async def run():
+        response = await files.download_file(str(file_id), request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        return response, body
+
+    return asyncio.run(run())
+
+
+def test_full_download(monkeypatch):
+    response, body = download(monkeypatch, {})
+    assert response.status_code == 200
+    assert body == CONTENT
+    assert response.headers["content-length"] == str(len(CONTENT))
+
+
+def test_single_range(monkeypatch):
+    response, body = download(monkeypatch, {"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert body == CONTENT[2:6]
+    assert response.headers["content-range"] == f"bytes 2-5/{len(CONTENT)}"
+
+
+def test_multiple_ranges(monkeypatch):
+    response, body = download(monkeypatch, {"Range": "bytes=0-1,-3"})
+    assert response.status_code == 206
+    assert response.headers["content-type"].startswith("multipart/byteranges")
+    assert CONTENT[0:2] in body and CONTENT[-3:] in body
+    assert len(body) == int(response.headers["content-length"])
+
+
+def test_stale_if_range_serves_whole_file(monkeypatch):
+    response, body = download(monkeypatch, {"Range": "bytes=2-5", "If-Range": 'W/"abc"'})
+    assert response.status_code == 200
+    assert body == CONTENT
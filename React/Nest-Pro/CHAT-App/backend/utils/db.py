@@ -1,6 +1,10 @@
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo.errors import OperationFailure
 from config import settings
 
+# Mongo error raised when an index exists with different options
+INDEX_OPTIONS_CONFLICT = 85
+
 class Database:
     client: AsyncIOMotorClient = None
     db = None
@@ -8,6 +12,21 @@ class Database:
 
 db = Database()
 
+async def ensure_ttl_index(collection, field: str, expire_after_seconds: int):
+    """
+    Create a TTL index, or change the expiry of the existing one in place when
+    the configured value has changed since it was created.
+    """
+    try:
+        await collection.create_index(field, expireAfterSeconds=expire_after_seconds)
+    except OperationFailure as e:
+        if e.code != INDEX_OPTIONS_CONFLICT:
+            raise
+        await collection.database.command(
+            "collMod", collection.name,
+            index={"keyPattern": {field: 1}, "expireAfterSeconds": expire_after_seconds}
+        )
+
 async def connect_db():
     """Connect to MongoDB"""
     db.client = AsyncIOMotorClient(settings.MONGODB_URL)
@@ -19,6 +38,50 @@ async def connect_db():
     await db.db.users.create_index("username", unique=True)
     await db.db.messages.create_index([("sender_id", 1), ("receiver_id", 1)])
     await db.db.messages.create_index("room_id")
+    await db.db.messages.create_index(
+        [("sender_id", 1), ("client_id", 1)],
+        unique=True,
+        partialFilterExpression={"client_id": {"$type": "string"}}
+    )
+    await db.db.jobs.create_index([("status", 1), ("created_at", 1)])
+    await ensure_ttl_index(db.db.jobs, "finished_at", settings.JOB_RETENTION_DAYS * 86400)  # TTL
+    await db.db.pinned_messages.create_index("chat_id")
+    await db.db.pinned_messages.create_index("expires_at", expireAfterSeconds=0)  # TTL
+    await db.db.deleted_files.create_index("permanent_delete_at")
+    await db.db.deleted_files.create_index([("owner_id", 1), ("permanent_delete_at", 1)])
+    await db.db.file_hashes.create_index("file_id")
+    await db.db["fs.files"].create_index("metadata.thumbnail_of", sparse=True)
+    await db.db["fs.chunks"].create_index([("files_id", 1), ("n", 1)], unique=True)
+    await db.db.upload_sessions.create_index("expires_at")
+    await db.db.chat_media.create_index([("chat_key", 1), ("category", 1), ("timestamp", -1), ("_id", -1)])
+    await db.db.chat_media.create_index("message_id")
+    await db.db.users.create_index("contacts")
+    await db.db.status_feeds.create_index([("owner_id", 1), ("contact_id", 1)], unique=True)
+    await db.db.status_feeds.create_index("contact_id")
+    await db.db.status_feeds.create_index("expires_at", expireAfterSeconds=0)  # TTL
+    await db.db.status_views.create_index([("status_id", 1), ("viewer_id", 1)], unique=True)
+    await db.db.status_views.create_index([("status_id", 1), ("viewed_at", -1), ("_id", -1)])
+    await db.db.statuses.create_index([("user_id", 1), ("created_at", -1)])
+    status_ttl = settings.STATUS_EXPIRY_HOURS * 3600 + settings.STATUS_TTL_GRACE_SECONDS
+    await ensure_ttl_index(db.db.statuses, "created_at", status_ttl)  # TTL
+    await ensure_ttl_index(db.db.status_views, "viewed_at", status_ttl)  # TTL
+    # Call logs written before shared records only know their caller and callee
+    legacy_people = {"$setUnion": [
+        ["$caller_id"],
+        {"$cond": [{"$ifNull": ["$callee_id", False]}, ["$callee_id"], []]}
+    ]}
+    await db.db.call_history.update_many(
+        {"visible_to": {"$exists": False}},
+        [
+            {"$set": {"participants": {"$ifNull": ["$participants", legacy_people]}}},
+            {"$set": {"visible_to": {"$setUnion": ["$participants", {"$ifNull": ["$missed_by", []]}]}}}
+        ]
+    )
+    await db.db.call_history.create_index([("visible_to", 1), ("timestamp", -1), ("_id", -1)])
+    await db.db.call_history.create_index([("missed_by", 1), ("timestamp", -1)])
+    await db.db.call_history.create_index("call_id")
+    await db.db.call_stats.create_index([("call_id", 1), ("user_id", 1)], unique=True)
+    await ensure_ttl_index(db.db.call_stats, "updated_at", settings.CALL_STATS_RETENTION_DAYS * 86400)  # TTL
     
     print(f"✅ Connected to MongoDB: {settings.DATABASE_NAME}")
 
@@ -0,0 +1,117 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+# Requests with more ranges than this are served as the whole file
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    """Raised when no requested byte range overlaps the resource"""
+
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[List[Tuple[int, int]]]:
+    """
+    Parse a 'bytes=' Range header into inclusive (start, end) pairs.
+    Returns None when the whole resource should be served (no header,
+    unsupported unit or malformed value).
+    """
+    if not header:
+        return None
+
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+
+    parts = [part.strip() for part in spec.split(",") if part.strip()]
+    if not parts or len(parts) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in parts:
+        start_str, sep, end_str = part.partition("-")
+        if not sep:
+            return None
+
+        try:
+            if not start_str:
+                # Suffix range: last N bytes
+                length = int(end_str)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(start_str)
+                end = int(end_str) if end_str else size - 1
+                if end_str and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+
+        if start < size:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    return ranges
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def if_range_matches(if_range: Optional[str], etag: str, last_modified: datetime) -> bool:
+    """
+    Check an If-Range header, which holds either an entity tag or an HTTP date.
+    Both need an exact (strong) match; weak tags and wildcards never match.
+    """
+    if not if_range:
+        return False
+
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == etag
+    if if_range.startswith("W/"):
+        return False
+
+    try:
+        date = parsedate_to_datetime(if_range)
+    except (TypeError, ValueError):
+        return False
+
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date == last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def not_modified_since(if_modified_since: Optional[str], last_modified: datetime) -> bool:
+    """Check If-Modified-Since against a naive UTC modification time"""
+    if not if_modified_since:
+        return False
+
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+
+    # HTTP dates have one-second resolution
+    modified = last_modified.replace(tzinfo=timezone.utc, microsecond=0)
+    return modified <= since
+
+
+def http_date(value: datetime) -> str:
+    """Format a naive UTC datetime as an HTTP date"""
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
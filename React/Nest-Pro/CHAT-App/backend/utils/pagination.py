@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+from bson import ObjectId
+
+# (timestamp, document id) of the last item on the previous page
+Cursor = Tuple[datetime, Optional[ObjectId]]
+
+
+class InvalidCursor(ValueError):
+    """Raised for a malformed 'before' pagination cursor"""
+
+
+def parse_cursor(before: Optional[str]) -> Optional[Cursor]:
+    """
+    Parse a "<timestamp>|<id>" cursor; a bare timestamp is still accepted.
+    The id breaks ties between documents sharing a timestamp.
+    """
+    if not before:
+        return None
+
+    timestamp, _, doc_id = before.partition("|")
+    try:
+        timestamp = datetime.fromisoformat(timestamp)
+    except ValueError:
+        raise InvalidCursor("Invalid cursor")
+    if doc_id and not ObjectId.is_valid(doc_id):
+        raise InvalidCursor("Invalid cursor")
+
+    return timestamp, ObjectId(doc_id) if doc_id else None
+
+
+def cursor_query(field: str, cursor: Cursor) -> dict:
+    """Documents after the cursor when sorted by (field, _id) descending"""
+    timestamp, doc_id = cursor
+    if doc_id is None:
+        return {field: {"$lt": timestamp}}
+    return {"$or": [
+        {field: {"$lt": timestamp}},
+        {field: timestamp, "_id": {"$lt": doc_id}}
+    ]}
+
+
+def next_cursor(docs: List[dict], field: str, limit: int) -> Optional[str]:
+    """Cursor for the page after docs, or None once the last page is reached"""
+    if len(docs) < limit:
+        return None
+    last = docs[-1]
+    return f"{last[field].isoformat()}|{last['_id']}"
@@ -1,4 +1,4 @@
-import { useState, useEffect } from 'react';
+import { useState, useEffect, useRef } from 'react';
 
 interface GroupCallIncoming {
     roomId: string;
@@ -17,6 +17,9 @@ export function GroupCallModal({ sendMessage }: GroupCallModalProps) {
     const [isInGroupCall, setIsInGroupCall] = useState(false);
     const [participants, setParticipants] = useState<string[]>([]);
     const [currentRoomId, setCurrentRoomId] = useState<string | null>(null);
+    // Read by window event handlers, which are registered once
+    const currentRoomRef = useRef<string | null>(null);
+    currentRoomRef.current = currentRoomId;
 
     useEffect(() => {
         const handleIncoming = (e: CustomEvent<GroupCallIncoming>) => {
@@ -34,6 +37,17 @@ export function GroupCallModal({ sendMessage }: GroupCallModalProps) {
             }
         };
 
+        // The server ended the call, e.g. nobody answered in time
+        const handleEnded = (e: CustomEvent) => {
+            const roomId = e.detail.room_id;
+            setIncomingCall(call => (call?.roomId === roomId ? null : call));
+            if (currentRoomRef.current === roomId) {
+                setIsInGroupCall(false);
+                setCurrentRoomId(null);
+                setParticipants([]);
+            }
+        };
+
         // Handle starting a group call from chat header
         const handleStartGroupCall = (e: CustomEvent) => {
             const { roomId, callType, callId } = e.detail;
@@ -51,12 +65,14 @@ export function GroupCallModal({ sendMessage }: GroupCallModalProps) {
         window.addEventListener('groupCallIncoming', handleIncoming as EventListener);
         window.addEventListener('groupCallParticipantJoined', handleJoined as EventListener);
         window.addEventListener('groupCallParticipantLeft', handleLeft as EventListener);
+        window.addEventListener('groupCallEnded', handleEnded as EventListener);
         window.addEventListener('startGroupCall', handleStartGroupCall as EventListener);
 
         return () => {
             window.removeEventListener('groupCallIncoming', handleIncoming as EventListener);
             window.removeEventListener('groupCallParticipantJoined', handleJoined as EventListener);
             window.removeEventListener('groupCallParticipantLeft', handleLeft as EventListener);
+            window.removeEventListener('groupCallEnded', handleEnded as EventListener);
             window.removeEventListener('startGroupCall', handleStartGroupCall as EventListener);
         };
     }, [sendMessage]);
@@ -24,7 +24,9 @@ export function DeletedFilesPanel({ isOpen, onClose }: { isOpen: boolean; onClos
     const loadDeletedFiles = async () => {
         setLoading(true);
         try {
-            const res = await fetch(`${API_URL}/api/files/deleted`);
+            const res = await fetch(`${API_URL}/api/files/deleted`, {
+                headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
+            });
             const data = await res.json();
             setDeletedFiles(data.files || []);
         } catch (error) {
@@ -36,7 +38,10 @@ export function DeletedFilesPanel({ isOpen, onClose }: { isOpen: boolean; onClos
 
     const restoreFile = async (fileId: string) => {
         try {
-            await fetch(`${API_URL}/api/files/${fileId}/restore`, { method: 'POST' });
+            await fetch(`${API_URL}/api/files/${fileId}/restore`, {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
+            });
             setDeletedFiles(prev => prev.filter(f => f.file_id !== fileId));
         } catch (error) {
             console.error('Failed to restore file:', error);
@@ -401,7 +401,7 @@ function ContactItem({ contact, isActive, onClick, onArchive }: { contact: Conta
         try {
             await fetch(`${API_URL}/api/chats/${contact.contact_id}/action`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${localStorage.getItem('token')}` },
                 body: JSON.stringify({ action, chat_type: 'user', chat_name: contact.username })
             });
             handleCloseMenu();
@@ -635,7 +635,7 @@ function ArchivedContactItem({ archivedChat, contact, room, onClick, onUnarchive
         try {
             await fetch(`${API_URL}/api/chats/${archivedChat.chat_id}/action`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${localStorage.getItem('token')}` },
                 body: JSON.stringify({ action, chat_type: chatType })
             });
             handleCloseMenu();
@@ -752,7 +752,7 @@ function RoomItem({ room, isActive, onClick, onArchive }: { room: Room; isActive
         try {
             await fetch(`${API_URL}/api/chats/${room.id}/action`, {
                 method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
+                headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${localStorage.getItem('token')}` },
                 body: JSON.stringify({ action, chat_type: 'room', chat_name: room.name })
             });
             handleCloseMenu();
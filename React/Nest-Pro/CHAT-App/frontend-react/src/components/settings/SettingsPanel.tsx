@@ -180,6 +180,15 @@ export function SettingsPanel() {
                                 <span style={styles.toggleKnob(settings.read_receipts !== false)} />
                             </button>
                         </div>
+                        <div style={styles.settingRow}>
+                            <div style={styles.settingInfo}>
+                                <div style={styles.settingLabel}>Arise response cache</div>
+                                <div style={styles.settingDesc}>Reuse Arise replies to identical prompts</div>
+                            </div>
+                            <button style={styles.toggle(settings.arise_response_cache !== false)} onClick={() => handleSettingChange('arise_response_cache', settings.arise_response_cache === false)}>
+                                <span style={styles.toggleKnob(settings.arise_response_cache !== false)} />
+                            </button>
+                        </div>
 
                         <h3 style={{ ...styles.sectionTitle, marginTop: '32px' }}>SECURITY</h3>
                         <button style={styles.actionBtn} onClick={async () => {
@@ -2,6 +2,7 @@ import { useEffect, useRef, useCallback } from 'react';
 import { useAuthStore } from '../stores/authStore';
 import { useChatStore } from '../stores/chatStore';
 import { useCallStore } from '../stores/callStore';
+import { useStatusStore } from '../stores/statusStore';
 import type { Message } from '../types';
 
 const WS_URL = 'ws://127.0.0.1:8000/ws';
@@ -90,7 +91,13 @@ export function useWebSocket() {
                         handleRemoteIceCandidate(data.candidate);
                         break;
 
+                    case 'ice_candidates':
+                        console.log(`🧊 ${data.candidates.length} ICE candidates received`);
+                        data.candidates.forEach((candidate: RTCIceCandidateInit) => handleRemoteIceCandidate(candidate));
+                        break;
+
                     case 'call_end':
+                    case 'call_ended':
                         console.log('📞 Call ended by remote:', data);
                         if (data.reason === 'declined') {
                             // Show "user is busy" message
@@ -134,6 +141,11 @@ export function useWebSocket() {
                         window.dispatchEvent(new CustomEvent('groupCallParticipantLeft', { detail: data }));
                         break;
 
+                    case 'group_call_ended':
+                        console.log(`📞 Group call ended (${data.reason}):`, data.room_id);
+                        window.dispatchEvent(new CustomEvent('groupCallEnded', { detail: data }));
+                        break;
+
                     case 'group_call_offer':
                         console.log('📞 Group call offer from:', data.from);
                         window.dispatchEvent(new CustomEvent('groupCallOffer', { detail: data }));
@@ -148,6 +160,20 @@ export function useWebSocket() {
                         console.log('🧊 Group call ICE from:', data.from);
                         window.dispatchEvent(new CustomEvent('groupCallIce', { detail: data }));
                         break;
+
+                    case 'group_call_error':
+                        console.warn(`📞 Group call ${data.request} rejected:`, data.error);
+                        window.dispatchEvent(new CustomEvent('groupCallError', { detail: data }));
+                        break;
+
+                    case 'status_created':
+                    case 'status_expired':
+                        if (data.user_id === user.id) {
+                            useStatusStore.getState().loadMyStatuses();
+                        } else {
+                            useStatusStore.getState().loadContactStatuses();
+                        }
+                        break;
                 }
             } catch (error) {
                 console.error('WebSocket message parse error:', error);
@@ -56,6 +56,9 @@ class WebRTCService {
         this.peerConnection.onicecandidate = (event) => {
             if (event.candidate) {
                 this.emit('iceCandidate', event.candidate.toJSON());
+            } else {
+                // Gathering finished - lets the server flush its batch immediately
+                this.emit('iceCandidate', null);
             }
         };
 
@@ -249,7 +249,6 @@ export const useCallStore = create<CallState>((set, get) => {
                     call_id: incomingCall.callId,
                     reason: 'declined'
                 });
-                get().createCallLog(incomingCall.from, incomingCall.callType, 'rejected', 0);
             }
             set({ incomingCall: null });
         },
@@ -258,15 +257,11 @@ export const useCallStore = create<CallState>((set, get) => {
             const { activeCall, sendWebSocket } = get();
 
             if (activeCall && sendWebSocket) {
+                // The server records the call in history when it ends
                 sendWebSocket({
                     type: 'call_end',
                     call_id: activeCall.callId
                 });
-
-                if (activeCall.startTime) {
-                    const duration = Math.floor((Date.now() - activeCall.startTime.getTime()) / 1000);
-                    get().createCallLog(activeCall.peerId, activeCall.callType, 'completed', duration);
-                }
             }
 
             webRTCService.cleanup();
@@ -17,6 +17,7 @@ interface UserSettings {
     enter_is_send?: boolean;
     media_auto_download?: 'always' | 'wifi' | 'never';
     notification_groups?: boolean;
+    arise_response_cache?: boolean;
     // Auto-save files setting
     autoSaveFiles?: boolean;
 }
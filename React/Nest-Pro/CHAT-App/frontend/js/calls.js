@@ -141,7 +141,7 @@ function initiateCall(userId, callType) {
 }
 
 // Log a call when it ends
-async function logCall(calleeId, callType, status, duration = 0) {
+async function logCall(calleeId, callType, status, duration = 0, callId = null) {
     try {
         await fetch(`${API_URL}/api/calls`, {
             method: 'POST',
@@ -153,7 +153,8 @@ async function logCall(calleeId, callType, status, duration = 0) {
                 callee_id: calleeId,
                 call_type: callType,
                 status: status,
-                duration: duration
+                duration: duration,
+                call_id: callId
             })
         });
     } catch (error) {
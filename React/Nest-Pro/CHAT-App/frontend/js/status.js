@@ -1623,14 +1623,15 @@ async function showStatusViews(statusId) {
         });
 
         if (response.ok) {
-            const viewers = await response.json();
+            // The endpoint returns one page of viewers plus the total count
+            const { items: viewers, total } = await response.json();
 
             const modal = document.createElement('div');
             modal.className = 'pin-modal';
             modal.id = 'statusViewsModal';
             modal.innerHTML = `
                 <div class="pin-modal-content">
-                    <h3 class="pin-modal-title">Viewed by</h3>
+                    <h3 class="pin-modal-title">Viewed by ${total}</h3>
                     <div class="status-viewers-list">
                         ${viewers.length === 0 ? '<p class="text-gray-500 text-center py-4">No views yet</p>' :
                     viewers.map(v => `
@@ -484,7 +484,7 @@ function cleanupCall(status = 'completed') {
         // Only log outgoing calls (caller logs)
         if (callState === 'outgoing' || (callState === 'connected' && !window.isIncomingCall)) {
             if (typeof logCall === 'function') {
-                logCall(AppState.currentChat, currentCallType, finalStatus, callDuration);
+                logCall(AppState.currentChat, currentCallType, finalStatus, callDuration, currentCallId);
             }
         }
     }
@@ -124,6 +124,11 @@ function handleWsMessage(data) {
             handleIceCandidate(data);
             break;
 
+        case 'ice_candidates':
+            // Candidates gathered within a short window arrive in one frame
+            data.candidates.forEach(candidate => handleIceCandidate({ ...data, candidate }));
+            break;
+
         case 'call_ended':
             handleCallEnded(data);
             break;